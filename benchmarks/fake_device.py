@@ -0,0 +1,206 @@
+"""Local stand-in for a fhwise amplifier.
+
+Serves the UDP commands used by the fhwise component with configurable
+latency, jitter, packet drops, playlist size and zone count.
+
+    python -m benchmarks.fake_device --host 127.0.0.2 --port 8080
+
+With --count N, devices listen on N consecutive addresses from --host on.
+"""
+import ipaddress
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+from custom_components.fhwise.client import build_frame, parse_frame
+
+_LOGGER = logging.getLogger(__name__)
+
+MODEL_4_AREA = "WISE-WLBM209-FLS101"
+MODEL_NO_AREA = "WISE-FAKE"
+
+
+def _int32(value):
+    return int(value).to_bytes(length=4, byteorder="little", signed=True)
+
+
+def _from_int32(payload):
+    return int.from_bytes(payload, byteorder="little", signed=True)
+
+
+class FakeFhwiseDevice(asyncio.DatagramProtocol):
+    """Answer fhwise requests like a real amplifier."""
+
+    def __init__(
+        self,
+        latency=0.01,
+        jitter=0.0,
+        drop=0.0,
+        tracks=100,
+        zones=4,
+        seed=None,
+    ):
+        """Initialize the fake device."""
+        self.latency = latency
+        self.jitter = jitter
+        self.drop = drop
+        self.zones = zones
+        self.model = MODEL_4_AREA if zones else MODEL_NO_AREA
+        self.names = [f"Track {i:05d}" for i in range(tracks)]
+        self.calls = 0
+        self.dropped = 0
+        self.transport = None
+        self._random = random.Random(seed)
+
+        self.volume = 8
+        self.areas = [[zone, 8, 1] for zone in range(zones)]
+        self.status = 1
+        self.play_mode = 0
+        self.source = 0
+        self.eq_switch = 0
+        self.eq_type = 0
+        self.current = 0
+        self._position = 0
+        self._position_at = time.monotonic()
+
+    def connection_made(self, transport):
+        """Store the datagram transport."""
+        self.transport = transport
+
+    @property
+    def position(self):
+        """Return the play position in ms."""
+        if self.status != 1:
+            return self._position
+        return self._position + int((time.monotonic() - self._position_at) * 1000)
+
+    def _seek(self, position):
+        self._position = position
+        self._position_at = time.monotonic()
+
+    def _track_info(self, index):
+        name = self.names[index]
+        return f"{index}::{name}::240000::Artist of {name}::/mnt/sd/{name}.mp3"
+
+    def handle(self, code, payload):
+        """Apply a command and return the reply payload."""
+        if code == 0xC0:
+            return self.model.encode()
+        if code == 0xC1:
+            self._seek(self.position)
+            self.status = 2 if self.status == 1 else 1
+            return b""
+        if code == 0xC4:
+            if payload == b"\x31":
+                self.play_mode = (self.play_mode + 1) % 4
+            return _int32(self.play_mode)
+        if code == 0xC6:
+            return _int32(self.status)
+        if code == 0xC9:
+            return _int32(self.position)
+        if code == 0xCA:
+            return self.names[self.current].encode() if self.names else b""
+        if code == 0xCB:
+            return b"room::1"
+        if code == 0xCC:
+            self._seek(_from_int32(payload))
+            return _int32(self.position)
+        if code == 0xCE:
+            return _int32(len(self.names))
+        if code == 0xCF:
+            return self._track_info(_from_int32(payload)).encode()
+        if code == 0xD0:
+            self.current = _from_int32(payload)
+            self._seek(0)
+            return _int32(0)
+        if code == 0xD2:
+            self.volume = _from_int32(payload)
+            return _int32(self.volume)
+        if code == 0xD3:
+            return _int32(self.volume)
+        if code == 0xD6:
+            source = _from_int32(payload)
+            if source >= 0:
+                self.source = source
+            return _int32(self.source)
+        if code == 0xDC:
+            zone = self.areas[_from_int32(payload)]
+            return ("%d::%d::%d" % tuple(zone)).encode()
+        if code == 0xDD:
+            zone, volume, on = (int(v) for v in payload.decode().split("::"))
+            self.areas[zone] = [zone, volume, on]
+            return payload
+        if code == 0xDE:
+            return _int32(self.eq_type)
+        if code == 0xDF:
+            self.eq_type = _from_int32(payload)
+            return _int32(self.eq_type)
+        if code == 0xE0:
+            return _int32(self.eq_switch)
+        if code == 0xE1:
+            self.eq_switch = _from_int32(payload)
+            return _int32(self.eq_switch)
+        if code == 0xE3:
+            return b""
+        raise ValueError(f"Unknown command {code:#x}")
+
+    def datagram_received(self, data, addr):
+        """Answer a request after the configured latency."""
+        self.calls += 1
+        if self._random.random() < self.drop:
+            self.dropped += 1
+            return
+        code, payload, cmdid = parse_frame(data)
+        reply = build_frame(code, self.handle(code, payload), cmdid)
+        delay = max(0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+        asyncio.get_running_loop().call_later(
+            delay, self.transport.sendto, reply, addr
+        )
+
+
+async def async_start_device(host, port, **kwargs):
+    """Start a fake device listening on host:port."""
+    loop = asyncio.get_running_loop()
+    _, device = await loop.create_datagram_endpoint(
+        lambda: FakeFhwiseDevice(**kwargs), local_addr=(host, port)
+    )
+    return device
+
+
+async def _async_main(args):
+    first = ipaddress.ip_address(args.host)
+    for i in range(args.count):
+        device = await async_start_device(
+            str(first + i),
+            args.port,
+            latency=args.latency,
+            jitter=args.jitter,
+            drop=args.drop,
+            tracks=args.tracks,
+            zones=args.zones,
+        )
+        _LOGGER.info(f"Fake {device.model} listening on {first + i}:{args.port}")
+    print("ready", flush=True)
+    await asyncio.Event().wait()
+
+
+def main():
+    """Run a fake device from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.2")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--count", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--drop", type=float, default=0.0)
+    parser.add_argument("--tracks", type=int, default=100)
+    parser.add_argument("--zones", type=int, default=4)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_async_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Memory of the cached playlist and its name index.
+
+Fills the playlists of several devices as a refresh would, from raw list
+entries, and reports the bytes they hold.
+
+    python -m benchmarks.memory --devices 20 --tracks 10000
+"""
+import argparse
+import random
+import tracemalloc
+
+from custom_components.fhwise.playlist import FhwisePlaylist, parse_track
+
+ARTISTS = 200
+FOLDERS = 50
+
+
+def _entries(count, seed):
+    """Return raw list entries of a library of count tracks."""
+    rng = random.Random(seed)
+    for i in range(count):
+        artist = f"Artist {rng.randrange(ARTISTS)}" if rng.random() < 0.7 else "<unknown>"
+        title = f"Song {i:05d} {rng.getrandbits(32):08x}"
+        folder = f"/mnt/internal_sd/Music/Album {rng.randrange(FOLDERS)}"
+        length = rng.randrange(120000, 480000)
+        yield f"{i}::{title}::{length}::{artist}::{folder}/{title}.mp3"
+
+
+def measure(devices, tracks):
+    """Return (tracks, index) bytes held by devices playlists."""
+    playlists = [FhwisePlaylist() for _ in range(devices)]
+    tracemalloc.start()
+    baseline = tracemalloc.take_snapshot()
+    for seed, playlist in enumerate(playlists):
+        playlist.restore(parse_track(entry) for entry in _entries(tracks, seed))
+    loaded = tracemalloc.take_snapshot()
+    for playlist in playlists:
+        playlist.positions("")
+    indexed = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    def _size(after, before):
+        return sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+
+    return _size(loaded, baseline), _size(indexed, loaded)
+
+
+def main():
+    """Run the measurement from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=20)
+    parser.add_argument("--tracks", type=int, default=10000)
+    args = parser.parse_args()
+    tracks, index = measure(args.devices, args.tracks)
+    mib = 1024 * 1024
+    print(f"{args.devices} devices x {args.tracks} tracks")
+    print(f"tracks: {tracks / mib:.1f} MiB, {tracks / args.devices / mib:.2f} MiB/device")
+    print(f"index:  {index / mib:.1f} MiB, {index / args.devices / mib:.2f} MiB/device")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Playlist cache benchmark against a fake device serving a large list.
+
+Loads the list once, then edits it on the fake between refreshes and
+reports the time and device reads each playlist refresh took, next to
+the reads a full crawl of the list costs. Downloads are paced by the
+connection's rate limit like any background read. Scenarios, in order:
+
+- cold: first load, nothing cached
+- unchanged: same list again
+- insert: one track inserted in the middle
+- append: one track added at the end
+- remove: one track removed
+
+    python -m benchmarks.playlist --tracks 5000
+"""
+import argparse
+import asyncio
+import time
+
+from custom_components.fhwise.connection import FhwiseConnection
+from custom_components.fhwise.media_player import FhwiseMusicPlayerDevice
+
+from .fake_device import async_start_device
+
+HOST = "127.0.0.2"
+DEVICE_PORT = 18080
+LOCAL_PORT = 18081
+
+
+def _insert(names):
+    names.insert(len(names) // 2, "Inserted track")
+
+
+def _append(names):
+    names.append("Appended track")
+
+
+def _remove(names):
+    del names[len(names) // 3]
+
+
+SCENARIOS = [
+    ("cold", None),
+    ("unchanged", None),
+    ("insert", _insert),
+    ("append", _append),
+    ("remove", _remove),
+]
+
+
+async def _async_refresh_playlist(device):
+    """Refresh the playlist, waiting for the download."""
+    await device.async_update_playlist()
+    while device._playlist.loading:
+        await asyncio.sleep(0.01)
+
+
+async def async_bench(args):
+    """Run every scenario in order against one fake device."""
+    fake = await async_start_device(
+        HOST, DEVICE_PORT, latency=args.latency, jitter=args.jitter, tracks=args.tracks
+    )
+    connection = FhwiseConnection(HOST, DEVICE_PORT, local_port=LOCAL_PORT)
+    await connection.async_start()
+    device = FhwiseMusicPlayerDevice(connection, HOST, DEVICE_PORT, connection.model)
+
+    results = []
+    for name, edit in SCENARIOS:
+        if edit is not None:
+            edit(fake.names)
+        await device.async_update_settings()
+        calls = device.calls
+        start = time.monotonic()
+        await _async_refresh_playlist(device)
+        results.append(
+            {
+                "scenario": name,
+                "tracks": len(device.tracks),
+                "time_s": round(time.monotonic() - start, 3),
+                "reads": device.calls - calls,
+                "crawl_reads": len(fake.names),
+            }
+        )
+        assert [track[1] for track in device.tracks] == fake.names
+
+    await connection.async_stop()
+    fake.transport.close()
+    return results
+
+
+def main():
+    """Run the benchmark from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tracks", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--jitter", type=float, default=0.002)
+    args = parser.parse_args()
+
+    results = asyncio.run(async_bench(args))
+    keys = list(results[0])
+    print(" ".join(f"{key:>12}" for key in keys))
+    for result in results:
+        print(" ".join(f"{result[key]:>12}" for key in keys))
+
+
+if __name__ == "__main__":
+    main()
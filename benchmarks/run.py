@@ -0,0 +1,247 @@
+"""End-to-end performance benchmark of the fhwise component.
+
+Starts fake devices on 127.0.0.x in a child process and drives real FhwiseConnection and
+FhwiseMusicPlayerDevice objects against them, reporting per scale:
+
+- full and fast refresh cycle time
+- device calls per cycle
+- command latency, idle and behind a refresh loop and playlist download
+- event loop blocking
+- memory per device
+
+    python -m benchmarks.run --devices 1 10 100
+"""
+import argparse
+import asyncio
+import ipaddress
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+
+from custom_components.fhwise.connection import FhwiseConnection
+from custom_components.fhwise.media_player import FhwiseMusicPlayerDevice
+from custom_components.fhwise.scheduler import PRIORITY_POLL, request_priority
+
+FIRST_HOST = "127.0.0.2"
+DEVICE_PORT = 18080
+LOCAL_PORT = 18081
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class LoopMonitor:
+    """Measure how long the event loop is kept from running a timer."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.lags = []
+        self._task = None
+
+    async def _async_run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0, loop.time() - start - self.interval))
+
+    def start(self):
+        self._task = asyncio.create_task(self._async_run())
+
+    def stop(self):
+        self._task.cancel()
+
+
+async def _async_wait_playlists(devices):
+    while any(device._playlist.loading for device in devices):
+        await asyncio.sleep(0.01)
+
+
+def _memory_per_device(device, copies=10):
+    """Return the bytes held by a device restored from device's state.
+
+    tracemalloc slows the loop enough to time out requests at scale, so
+    memory is measured on offline copies rather than during the refresh.
+    """
+    stored = json.dumps(device.as_dict())
+    tracemalloc.start()
+    baseline = tracemalloc.take_snapshot()
+    copies = [
+        FhwiseMusicPlayerDevice(
+            device._player, device._host, device._port, device._model
+        )
+        for _ in range(copies)
+    ]
+    for copy in copies:
+        copy.restore(json.loads(stored))
+        copy._playlist.find("")
+    memory = tracemalloc.take_snapshot().compare_to(baseline, "filename")
+    tracemalloc.stop()
+    return sum(stat.size_diff for stat in memory) / len(copies)
+
+
+async def _async_background_load(devices, downloading, interval):
+    """Refresh every device each interval while downloading a full playlist."""
+    request_priority.set(PRIORITY_POLL)
+    await downloading.async_update()
+    while True:
+        await asyncio.gather(*[device.async_update_fast() for device in devices])
+        await asyncio.sleep(interval)
+
+
+async def _async_command_latencies(device, commands):
+    """Return the latency of commands play/pause toggles of device."""
+    latencies = []
+    for _ in range(commands):
+        start = time.monotonic()
+        await device.async_media_play_pause()
+        latencies.append(time.monotonic() - start)
+    return latencies
+
+
+async def _async_start_fakes(count, args):
+    """Start count fake devices in a child process.
+
+    A separate process keeps the fakes from competing with the component
+    for the event loop, as real devices would.
+    """
+    process = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-m",
+        "benchmarks.fake_device",
+        "--host",
+        FIRST_HOST,
+        "--port",
+        str(DEVICE_PORT),
+        "--count",
+        str(count),
+        "--latency",
+        str(args.latency),
+        "--jitter",
+        str(args.jitter),
+        "--drop",
+        str(args.drop),
+        "--tracks",
+        str(args.tracks),
+        "--zones",
+        str(args.zones),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    await process.stdout.readline()
+    return process
+
+
+async def async_bench(count, args):
+    """Run the benchmark against count fake devices."""
+    fakes = await _async_start_fakes(count, args)
+    first = ipaddress.ip_address(FIRST_HOST)
+
+    connections = []
+    devices = []
+    for i in range(count):
+        host = str(first + i)
+        connection = FhwiseConnection(host, DEVICE_PORT, local_port=LOCAL_PORT)
+        await connection.async_start()
+        connections.append(connection)
+        devices.append(
+            FhwiseMusicPlayerDevice(connection, host, DEVICE_PORT, connection.model)
+        )
+
+    def _reset_calls():
+        for device in devices:
+            device.calls = 0
+
+    def _calls():
+        return sum(device.calls for device in devices) / count
+
+    _reset_calls()
+    start = time.monotonic()
+    await asyncio.gather(*[device.async_update() for device in devices])
+    await _async_wait_playlists(devices)
+    full_time = time.monotonic() - start
+    full_calls = _calls()
+
+    memory_per_device = _memory_per_device(devices[0])
+
+    monitor = LoopMonitor()
+    monitor.start()
+    cycle_times = []
+    _reset_calls()
+    for _ in range(args.cycles):
+        start = time.monotonic()
+        await asyncio.gather(*[device.async_update_fast() for device in devices])
+        cycle_times.append(time.monotonic() - start)
+        await asyncio.sleep(args.cycle_interval)
+    fast_calls = _calls() / args.cycles
+
+    latencies = await _async_command_latencies(devices[0], args.commands)
+
+    # A second device on the first connection starts with an empty playlist
+    first = devices[0]
+    downloading = FhwiseMusicPlayerDevice(
+        first._player, first._host, first._port, first._model
+    )
+    load = asyncio.create_task(
+        _async_background_load(devices, downloading, args.cycle_interval)
+    )
+    while not downloading._playlist.loading and not load.done():
+        await asyncio.sleep(0.01)
+    loaded_latencies = await _async_command_latencies(first, args.commands)
+    load.cancel()
+    downloading._playlist.cancel()
+
+    monitor.stop()
+    for connection in connections:
+        await connection.async_stop()
+    fakes.terminate()
+    await fakes.wait()
+
+    available = sum(device.available for device in devices)
+    return {
+        "devices": count,
+        "available": available,
+        "full_refresh_s": round(full_time, 3),
+        "full_refresh_calls": round(full_calls, 1),
+        "fast_cycle_p50_ms": round(statistics.median(cycle_times) * 1000, 1),
+        "fast_cycle_p99_ms": round(_percentile(cycle_times, 0.99) * 1000, 1),
+        "fast_cycle_calls": round(fast_calls, 1),
+        "command_p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "command_p99_ms": round(_percentile(latencies, 0.99) * 1000, 1),
+        "loaded_command_p50_ms": round(statistics.median(loaded_latencies) * 1000, 1),
+        "loaded_command_p99_ms": round(
+            _percentile(loaded_latencies, 0.99) * 1000, 1
+        ),
+        "loop_block_max_ms": round(max(monitor.lags, default=0) * 1000, 1),
+        "loop_block_total_ms": round(sum(monitor.lags) * 1000, 1),
+        "memory_per_device_kib": round(memory_per_device / 1024, 1),
+    }
+
+
+def main():
+    """Run the benchmark from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--jitter", type=float, default=0.002)
+    parser.add_argument("--drop", type=float, default=0.0)
+    parser.add_argument("--tracks", type=int, default=500)
+    parser.add_argument("--zones", type=int, default=4)
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--cycle-interval", type=float, default=0.5)
+    parser.add_argument("--commands", type=int, default=20)
+    args = parser.parse_args()
+
+    results = [asyncio.run(async_bench(count, args)) for count in args.devices]
+    keys = list(results[0])
+    print(" ".join(f"{key:>22}" for key in keys))
+    for result in results:
+        print(" ".join(f"{result[key]:>22}" for key in keys))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,26 @@
 """The fhwise player component."""
+import asyncio
+from copy import deepcopy
 import logging
-from fhwise import FhwisePlayer
 
-from homeassistant.config_entries import ConfigEntry
+from homeassistant.config_entries import SOURCE_IMPORT, ConfigEntry
 from homeassistant.const import (
     CONF_HOST,
-    CONF_NAME,
     CONF_PORT,
 )
 from homeassistant.core import HomeAssistant
 from homeassistant.exceptions import ConfigEntryNotReady
 
+from .connection import async_get_connection, async_release_connection
 from .const import (
     DOMAIN,
+    FHWISE_METRICS,
+    FHWISE_MODEL,
     FHWISE_OBJECT,
 )
+from .metrics import FhwiseMetrics
 
-PLATFORMS = ["media_player"]
+PLATFORMS = ["media_player", "sensor"]
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -38,23 +42,22 @@ async def async_setup(hass: HomeAssistant, config: dict):
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     """Set up fhwise from a config entry."""
     port = entry.data[CONF_PORT]
-    host = entry.data(CONF_HOST)
-    name = entry.data(CONF_NAME)
-    fhPlayer = FhwisePlayer(host, port)
+    host = entry.data[CONF_HOST]
+    metrics = FhwiseMetrics()
     _LOGGER.info(f"Initializing with {host}:{port}")
 
     try:
-        fhPlayer.connect()
-        model = fhPlayer.send_heartbeat()
-        fhPlayer.disconnect()
-        _LOGGER.info(f"{model} detected")
+        fhPlayer = await async_get_connection(hass, host, port)
+        model = fhPlayer.model
+        _LOGGER.info(f"{model} detected in {metrics.record_setup('connected')}s")
     except Exception as err:
         _LOGGER.error(f"Error connecting to fhwise at {host}:{port}")
         raise ConfigEntryNotReady from err
 
     hass.data.setdefault(DOMAIN, {})[entry.entry_id] = {
-        FHWISE_OBJECT: monoprice,
-        FHWISE_MODEL: model
+        FHWISE_OBJECT: fhPlayer,
+        FHWISE_MODEL: model,
+        FHWISE_METRICS: metrics,
     }
 
     for component in PLATFORMS:
@@ -77,6 +80,7 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
     )
 
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)
+        data = hass.data[DOMAIN].pop(entry.entry_id)
+        await async_release_connection(hass, data[FHWISE_OBJECT])
 
     return unload_ok
@@ -0,0 +1,77 @@
+"""Circuit breaker pausing the refresh of unreachable devices."""
+import logging
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+FAILURE_THRESHOLD = 3
+RECOVERY_TIMEOUT = 30
+
+
+class FhwiseCircuitBreaker:
+    """Stop refreshing a device after consecutive failed refreshes.
+
+    Closed, every refresh runs. After failure_threshold failed refreshes in
+    a row the breaker opens and refreshes are skipped. Once
+    recovery_timeout seconds passed it is half open: the next refresh is
+    replaced by a single heartbeat, which closes the breaker when answered
+    and opens it again otherwise.
+    """
+
+    def __init__(
+        self,
+        name,
+        failure_threshold=FAILURE_THRESHOLD,
+        recovery_timeout=RECOVERY_TIMEOUT,
+    ):
+        """Initialize a closed breaker."""
+        self._name = name
+        self._failure_threshold = failure_threshold
+        self._recovery_timeout = recovery_timeout
+        self._failures = 0
+        self._opened_at = None
+        self.opened = 0
+        self.skipped = 0
+
+    @property
+    def state(self):
+        """Return closed, open or half_open."""
+        if self._opened_at is None:
+            return STATE_CLOSED
+        if time.monotonic() - self._opened_at < self._recovery_timeout:
+            return STATE_OPEN
+        return STATE_HALF_OPEN
+
+    def record_success(self):
+        """Close the breaker."""
+        if self._opened_at is not None:
+            _LOGGER.info(f"{self._name} answers again, resuming refresh")
+        self._failures = 0
+        self._opened_at = None
+
+    def record_failure(self):
+        """Count a failure, opening the breaker at the threshold."""
+        self._failures += 1
+        if self._opened_at is not None:
+            # Failed probe, wait a full recovery timeout again
+            self._opened_at = time.monotonic()
+        elif self._failures >= self._failure_threshold:
+            self._opened_at = time.monotonic()
+            self.opened += 1
+            _LOGGER.warning(
+                f"{self._name} failed {self._failures} refreshes in a row, "
+                f"probing it every {self._recovery_timeout}s"
+            )
+
+    def as_dict(self):
+        """Return the breaker state for diagnostics."""
+        return {
+            "state": self.state,
+            "failures": self._failures,
+            "opened": self.opened,
+            "skipped": self.skipped,
+        }
@@ -0,0 +1,310 @@
+"""Native asyncio client for the fhwise UDP protocol."""
+import asyncio
+import importlib
+import logging
+import socket
+import struct
+
+from .executor import FhwiseExecutorTransport
+from .transport import FhwiseTransport
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 3
+DEFAULT_MAX_IN_FLIGHT = 8
+# Replies of every device sharing an endpoint queue up in one socket
+RECEIVE_BUFFER = 1 << 20
+
+FRAME_HEADER = b"\x7e\x7e"
+FRAME_END = b"\x0d\x0a"
+
+
+def _int32(value):
+    return int(value).to_bytes(length=4, byteorder="little", signed=True)
+
+
+def _no_args():
+    return b""
+
+
+def _const(payload):
+    return lambda: payload
+
+
+def _area(number, volume, on):
+    return ("%d::%d::%d" % (number, volume, on)).encode("utf-8")
+
+
+def _eq_switch(on):
+    return _int32(1 if on else 0)
+
+
+def _to_int(payload):
+    return int.from_bytes(payload, byteorder="little", signed=True)
+
+
+def _to_str(payload):
+    return payload.decode("utf-8")
+
+
+def _to_bytes(payload):
+    return payload
+
+
+# command: (code, payload encoder, reply decoder), same as FhwisePlayer
+COMMANDS = {
+    "send_heartbeat": (0xC0, _no_args, _to_str),
+    "send_play_pause": (0xC1, _no_args, _to_bytes),
+    "get_play_mode": (0xC4, _const(b"\x30"), _to_int),
+    "set_toggle_play_mode": (0xC4, _const(b"\x31"), _to_int),
+    "get_play_status": (0xC6, _no_args, _to_int),
+    "get_current_file_position": (0xC9, _no_args, _to_int),
+    "get_current_file_name": (0xCA, _no_args, _to_str),
+    "get_current_room_info": (0xCB, _no_args, _to_str),
+    "set_current_file_position": (0xCC, _int32, _to_int),
+    "get_current_list_file_account": (0xCE, _no_args, _to_int),
+    "get_current_list_file_info": (0xCF, _int32, _to_str),
+    "set_current_list_play_file": (0xD0, _int32, _to_int),
+    "set_volume_level": (0xD2, _int32, _to_int),
+    "get_volume_level": (0xD3, _no_args, _to_int),
+    "get_volume_source": (0xD6, _const(_int32(-1)), _to_int),
+    "set_volume_source": (0xD6, _int32, _to_int),
+    "get_sub_area_control": (0xDC, _int32, _to_str),
+    "set_sub_area_control": (0xDD, _area, _to_str),
+    "get_eq_type": (0xDE, _no_args, _to_int),
+    "set_eq_type": (0xDF, _int32, _to_int),
+    "get_eq_switch": (0xE0, _no_args, _to_int),
+    "set_eq_switch": (0xE1, _eq_switch, _to_int),
+    "set_volume_toggle_mute": (0xE3, _no_args, _to_bytes),
+}
+
+# Commands whose reply starts with the requested index, "index::..."
+ECHOED_INDEX = {"get_current_list_file_info", "get_sub_area_control"}
+
+
+def build_frame(code, payload, cmdid):
+    """Build a fhwise frame."""
+    return (
+        FRAME_HEADER
+        + struct.pack(">HB", len(payload) + 4, code)
+        + payload
+        + bytes((cmdid,))
+        + FRAME_END
+    )
+
+
+def parse_frame(data):
+    """Parse a fhwise frame into (code, payload, cmdid)."""
+    if len(data) < 8 or data[:2] != FRAME_HEADER or data[-2:] != FRAME_END:
+        raise ValueError(f"Invalid frame {data.hex()}")
+    length, code = struct.unpack(">HB", data[2:5])
+    if length + 4 != len(data):
+        raise ValueError(f"Invalid frame length {data.hex()}")
+    return code, data[5:-3], data[-3]
+
+
+class FhwiseEndpoint(asyncio.DatagramProtocol):
+    """UDP socket bound to a local port, shared by every device using it.
+
+    The devices answer to the same port they listen on, so replies are
+    routed back to the owning client by source address.
+    """
+
+    def __init__(self, port):
+        """Initialize the endpoint."""
+        self.port = port
+        self.transport = None
+        self._clients = {}
+
+    def connection_made(self, transport):
+        """Store the datagram transport."""
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        """Route a reply to its client."""
+        client = self._clients.get(addr[0])
+        if client is None:
+            _LOGGER.debug(f"Dropping datagram from unknown {addr}")
+            return
+        client.frame_received(data)
+
+    def error_received(self, exc):
+        """Log socket errors, requests time out on their own."""
+        _LOGGER.debug(f"Endpoint on port {self.port} error: {exc}")
+
+    def connection_lost(self, exc):
+        """Fail every pending request."""
+        self.transport = None
+        for client in list(self._clients.values()):
+            client.fail_pending(exc or ConnectionError("Endpoint closed"))
+
+    def register(self, addr, client):
+        """Route replies from addr to client."""
+        self._clients[addr] = client
+
+    def unregister(self, addr):
+        """Stop routing replies from addr."""
+        self._clients.pop(addr, None)
+        return not self._clients
+
+    def sendto(self, data, addr):
+        """Send a datagram."""
+        if self.transport is None:
+            raise ConnectionError(f"Endpoint on port {self.port} is closed")
+        self.transport.sendto(data, addr)
+
+
+_ENDPOINTS = {}
+_ENDPOINTS_LOCK = asyncio.Lock()
+
+
+async def _async_get_endpoint(port):
+    """Return the shared endpoint bound to port, creating it on demand."""
+    async with _ENDPOINTS_LOCK:
+        endpoint = _ENDPOINTS.get(port)
+        if endpoint is None or endpoint.transport is None:
+            loop = asyncio.get_running_loop()
+            transport, endpoint = await loop.create_datagram_endpoint(
+                lambda: FhwiseEndpoint(port), local_addr=("0.0.0.0", port)
+            )
+            sock = transport.get_extra_info("socket")
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER)
+            except OSError as err:
+                _LOGGER.debug(f"Can not grow receive buffer of port {port}: {err}")
+            _ENDPOINTS[port] = endpoint
+        return endpoint
+
+
+def _release_endpoint(endpoint):
+    """Close endpoint once no client uses it."""
+    if _ENDPOINTS.get(endpoint.port) is endpoint:
+        del _ENDPOINTS[endpoint.port]
+    if endpoint.transport is not None:
+        endpoint.transport.close()
+
+
+class FhwiseAsyncClient(FhwiseTransport):
+    """Pipelining fhwise client.
+
+    Requests are tagged with a command id and several may be in flight at
+    once; replies are matched back by command id.
+    """
+
+    def __init__(
+        self,
+        host,
+        port,
+        timeout=DEFAULT_TIMEOUT,
+        max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+        local_port=None,
+    ):
+        """Initialize the client.
+
+        The device answers on the port it listens on, so the local port
+        defaults to the device port.
+        """
+        self.host = host
+        self.port = port
+        self._local_port = port if local_port is None else local_port
+        self._timeout = timeout
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._endpoint = None
+        self._addr = None
+        self._cmdid = 0
+        self._pending = {}
+
+    async def async_start(self):
+        """Resolve the device and join the shared endpoint."""
+        loop = asyncio.get_running_loop()
+        infos = await loop.getaddrinfo(self.host, self.port, type=socket.SOCK_DGRAM)
+        self._addr = infos[0][4][0]
+        self._endpoint = await _async_get_endpoint(self._local_port)
+        self._endpoint.register(self._addr, self)
+
+    async def async_stop(self):
+        """Fail pending requests and leave the endpoint."""
+        self.fail_pending(ConnectionError("Client stopped"))
+        if self._endpoint is not None:
+            if self._endpoint.unregister(self._addr):
+                _release_endpoint(self._endpoint)
+            self._endpoint = None
+
+    def _next_cmdid(self):
+        """Return the next free command id, range 1..255."""
+        for _ in range(255):
+            self._cmdid = self._cmdid % 255 + 1
+            if self._cmdid not in self._pending:
+                return self._cmdid
+        raise RuntimeError("No free command id")
+
+    def frame_received(self, data):
+        """Resolve the request matching a reply."""
+        try:
+            code, payload, cmdid = parse_frame(data)
+        except ValueError as err:
+            _LOGGER.error(f"Received invalid raw data from {self.host}: {err}")
+            return
+        request = self._pending.get(cmdid)
+        if request is None or request[0] != code:
+            # A late reply of a timed out request, its cmdid may be reused
+            _LOGGER.debug(f"Unexpected reply {data.hex()} from {self.host}")
+            return
+        if not request[1].done():
+            request[1].set_result(payload)
+
+    def fail_pending(self, exc):
+        """Fail every request in flight."""
+        for _, future in self._pending.values():
+            if not future.done():
+                future.set_exception(exc)
+
+    async def async_request(self, code, payload=b""):
+        """Send a raw command and wait for its reply payload."""
+        if self._endpoint is None:
+            raise ConnectionError(f"Client for {self.host} is not started")
+        async with self._in_flight:
+            cmdid = self._next_cmdid()
+            future = asyncio.get_running_loop().create_future()
+            self._pending[cmdid] = (code, future)
+            try:
+                frame = build_frame(code, payload, cmdid)
+                _LOGGER.debug(f"Send command to {self.host}: {frame.hex()}")
+                self._endpoint.sendto(frame, (self._addr, self.port))
+                return await asyncio.wait_for(future, self._timeout)
+            finally:
+                del self._pending[cmdid]
+
+    async def async_call(self, command, *args):
+        """Send a named command and decode its reply."""
+        code, encode, decode = COMMANDS[command]
+        reply = decode(await self.async_request(code, encode(*args)))
+        if command in ECHOED_INDEX and reply.split("::", 1)[0] != str(args[0]):
+            raise ValueError(f"{command}({args[0]}) of {self.host} got {reply!r}")
+        return reply
+
+
+async def async_create_transport(host, port, local_port=None):
+    """Return a started transport, preferring the native client.
+
+    py-fhwise is used when the native client can not reach the device,
+    e.g. firmware that does not echo the command id.
+    """
+    client = FhwiseAsyncClient(host, port, local_port=local_port)
+    try:
+        await client.async_start()
+        await client.send_heartbeat()
+        return client
+    except (OSError, asyncio.TimeoutError) as err:
+        await client.async_stop()
+        _LOGGER.warning(
+            f"Native client for {host}:{port} got no heartbeat ({err!r}), "
+            "falling back to py-fhwise"
+        )
+    # py-fhwise is only needed here, import it off the event loop
+    fhwise = await asyncio.get_running_loop().run_in_executor(
+        None, importlib.import_module, "fhwise"
+    )
+    transport = FhwiseExecutorTransport(fhwise.FhwisePlayer(host, port))
+    await transport.async_start()
+    return transport
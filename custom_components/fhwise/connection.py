@@ -0,0 +1,209 @@
+"""Long lived, self healing connection to a fhwise device."""
+import asyncio
+import logging
+import random
+import socket
+import time
+
+from .client import async_create_transport
+from .const import DATA_CONNECTIONS, DOMAIN
+from .scheduler import PRIORITY_BACKGROUND, FhwiseCommandScheduler, request_priority
+from .transport import FhwiseTransport
+
+_LOGGER = logging.getLogger(__name__)
+
+KEEPALIVE_INTERVAL = 30
+BACKOFF_BASE = 1
+BACKOFF_MAX = 120
+# Request timeouts in a row after which the link is considered broken
+MAX_REQUEST_TIMEOUTS = 5
+
+
+class FhwiseConnection(FhwiseTransport):
+    """Own the transport of one host:port.
+
+    Polling and commands share the same transport. A heartbeat is sent when
+    the link has been idle, and a failed link is rebuilt in the background
+    with jittered exponential backoff so restarting amplifiers do not all
+    reconnect in lockstep. A lost UDP reply only fails its own request;
+    the link counts as failed on a socket error, an unanswered heartbeat
+    or MAX_REQUEST_TIMEOUTS timeouts in a row.
+
+    Every request goes through a FhwiseCommandScheduler, so user commands
+    overtake queued refresh reads and the device is never flooded.
+    """
+
+    def __init__(
+        self,
+        host,
+        port,
+        keepalive_interval=KEEPALIVE_INTERVAL,
+        backoff_base=BACKOFF_BASE,
+        backoff_max=BACKOFF_MAX,
+        local_port=None,
+    ):
+        """Initialize the connection."""
+        self.host = host
+        self.port = port
+        self._local_port = local_port
+        self.model = None
+        self._keepalive_interval = keepalive_interval
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+        self._transport = None
+        self._last_activity = 0
+        self._failures = 0
+        self._timeouts = 0
+        self._connect_lock = asyncio.Lock()
+        self._reconnect_task = None
+        self._keepalive_task = None
+        self._users = 0
+        self.scheduler = FhwiseCommandScheduler()
+
+    @property
+    def connected(self):
+        """Return true when the transport is usable."""
+        return self._transport is not None
+
+    @property
+    def key(self):
+        """Return the registry key of this connection."""
+        return f"{self.host}:{self.port}"
+
+    async def async_start(self):
+        """Connect once and start the keepalive, raising on failure."""
+        await self._async_connect()
+        if self._keepalive_task is None:
+            self._keepalive_task = asyncio.create_task(self._async_keepalive())
+
+    async def async_stop(self):
+        """Stop background tasks and close the transport."""
+        for task in (self._keepalive_task, self._reconnect_task):
+            if task is not None:
+                task.cancel()
+        self._keepalive_task = None
+        self._reconnect_task = None
+        await self._async_close()
+
+    async def _async_connect(self):
+        """Open a transport and verify it with a heartbeat."""
+        async with self._connect_lock:
+            if self._transport is not None:
+                return
+            transport = await async_create_transport(
+                self.host, self.port, self._local_port
+            )
+            try:
+                self.model = await transport.send_heartbeat()
+            except Exception:
+                await transport.async_stop()
+                raise
+            self._transport = transport
+            self._failures = 0
+            self._timeouts = 0
+            self._last_activity = time.monotonic()
+            _LOGGER.debug(f"Connected to {self.model} at {self.key}")
+
+    async def _async_close(self):
+        """Close the current transport."""
+        transport, self._transport = self._transport, None
+        if transport is not None:
+            await transport.async_stop()
+
+    def _backoff(self):
+        """Return the next reconnect delay, full jitter."""
+        delay = min(self._backoff_max, self._backoff_base * 2 ** self._failures)
+        return random.uniform(0, delay)
+
+    async def _async_reconnect(self):
+        """Rebuild the transport until it answers a heartbeat."""
+        await self._async_close()
+        while True:
+            delay = self._backoff()
+            self._failures += 1
+            _LOGGER.debug(f"Reconnecting to {self.key} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            try:
+                await self._async_connect()
+                _LOGGER.info(f"Reconnected to {self.key}")
+                return
+            except Exception as err:
+                _LOGGER.debug(f"Reconnect to {self.key} failed: {err}")
+
+    def _schedule_reconnect(self):
+        """Start a reconnect unless one is running."""
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = asyncio.create_task(self._async_reconnect())
+
+    async def _async_keepalive(self):
+        """Send a heartbeat whenever the link has been idle."""
+        request_priority.set(PRIORITY_BACKGROUND)
+        # A failed heartbeat or a down link waits a full interval too
+        attempted = 0
+        while True:
+            last = max(self._last_activity, attempted)
+            idle = time.monotonic() - last
+            await asyncio.sleep(max(0, self._keepalive_interval - idle))
+            if time.monotonic() - max(self._last_activity, attempted) < (
+                self._keepalive_interval
+            ):
+                continue
+            attempted = time.monotonic()
+            if not self.connected:
+                continue
+            try:
+                await self.async_call("send_heartbeat")
+            except Exception:
+                pass
+
+    async def async_call(self, command, *args):
+        """Send a command, scheduling a reconnect if the link failed."""
+        transport = self._transport
+        if transport is None:
+            self._schedule_reconnect()
+            raise ConnectionError(f"Not connected to {self.key}")
+        try:
+            async with self.scheduler.slot():
+                result = await transport.async_call(command, *args)
+        except Exception as err:
+            if transport is self._transport and self._link_failed(command, err):
+                self._schedule_reconnect()
+            raise
+        self._timeouts = 0
+        self._last_activity = time.monotonic()
+        return result
+
+    def _link_failed(self, command, err):
+        """Return true when err means the link is broken, not one request."""
+        if isinstance(err, (asyncio.TimeoutError, socket.timeout)):
+            self._timeouts += 1
+            return (
+                command == "send_heartbeat"
+                or self._timeouts >= MAX_REQUEST_TIMEOUTS
+            )
+        return isinstance(err, OSError)
+
+
+async def async_get_connection(hass, host, port):
+    """Return the shared, started connection for host:port."""
+    connections = hass.data.setdefault(DOMAIN, {}).setdefault(DATA_CONNECTIONS, {})
+    key = f"{host}:{port}"
+    connection = connections.get(key)
+    if connection is None:
+        connection = connections[key] = FhwiseConnection(host, port)
+    connection._users += 1
+    try:
+        await connection.async_start()
+    except Exception:
+        await async_release_connection(hass, connection)
+        raise
+    return connection
+
+
+async def async_release_connection(hass, connection):
+    """Drop a user of connection, closing it when unused."""
+    connection._users -= 1
+    if connection._users > 0:
+        return
+    hass.data[DOMAIN][DATA_CONNECTIONS].pop(connection.key, None)
+    await connection.async_stop()
@@ -1,4 +1,10 @@
 """Constants for the fhwise Media Player component."""
 
 DOMAIN = "fhwise"
+CONF_INTERPOLATE_POSITION = "interpolate_position"
+CONF_SLOW_SCAN_INTERVAL = "slow_scan_interval"
 FHWISE_OBJECT = "fhwise_object"
+FHWISE_MODEL = "fhwise_model"
+DATA_CONNECTIONS = "connections"
+FHWISE_COORDINATOR = "fhwise_coordinator"
+FHWISE_METRICS = "fhwise_metrics"
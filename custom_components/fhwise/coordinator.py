@@ -0,0 +1,383 @@
+"""Central refresh of a fhwise device with fan-out to its entities."""
+import asyncio
+from collections import Counter
+from datetime import timedelta
+import logging
+import time
+
+from homeassistant.const import STATE_PLAYING
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.storage import Store
+
+from .breaker import STATE_HALF_OPEN, STATE_OPEN, FhwiseCircuitBreaker
+from .const import DOMAIN
+from .model import changed_fields
+from .scheduler import PRIORITY_POLL, request_priority
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_UPDATE_INTERVAL = timedelta(seconds=5)
+DEFAULT_SLOW_UPDATE_INTERVAL = timedelta(minutes=5)
+
+PAUSED_INTERVAL_FACTOR = 3
+IDLE_UPDATE_INTERVAL = timedelta(minutes=1)
+MAX_UNAVAILABLE_INTERVAL = timedelta(minutes=5)
+REQUEST_REFRESH_DELAY = 0.5
+
+# Share of update_interval a refresh cycle may take, and the cumulative
+# share of that budget by which each step has to be done
+REFRESH_BUDGET_FACTOR = 0.8
+STEP_DEADLINES = {"fast": 0.5, "slow": 0.8, "playlist": 1.0}
+# Deferrals in a row after which a step runs regardless of its deadline
+MAX_STEP_DEFERRALS = 3
+
+STORAGE_VERSION = 1
+STORAGE_SAVE_DELAY = 10
+
+
+class FhwiseCoordinator:
+    """Refresh a FhwiseMusicPlayerDevice and notify its entities.
+
+    Like DataUpdateCoordinator, but each listener subscribes to one area and
+    is only called when that area's slice of device state changed. Entities
+    then compare what they render and skip writes that would repeat it.
+
+    Refresh is split in two tiers. The fast tier (play status, position,
+    volume, areas) runs every update_interval. The slow tier (EQ, source,
+    play mode, playlist) runs every slow_update_interval, or on the next
+    tick after a command changed one of its settings.
+
+    The fast tier interval adapts to the device: update_interval while
+    playing, longer when paused or when every area is off, and growing
+    exponentially while the device is unavailable. A command is confirmed
+    shortly after by reading back only the fields it wrote; reads of a
+    refresh that started before the command are dropped for those fields.
+
+    Refreshes never overlap: a tick arriving while one runs is merged into
+    a single refresh right after it. Each cycle has a time budget split
+    across its steps. The fast tier always runs; the slow tier and the
+    playlist are left for the next cycle when their deadline passed before
+    they start, or cut off when they run past it. A step cut off once runs
+    to completion on the next cycle, so it always makes progress.
+
+    A circuit breaker stops refreshing a device that failed several
+    refreshes in a row, and only probes it with a heartbeat until it
+    answers again.
+
+    The first refresh always runs in the background, so setup never waits
+    for the device. The last known playlist and settings are stored per
+    device, so after a restart entities are served from storage meanwhile.
+    """
+
+    def __init__(
+        self,
+        hass,
+        device,
+        update_interval=DEFAULT_UPDATE_INTERVAL,
+        slow_update_interval=DEFAULT_SLOW_UPDATE_INTERVAL,
+    ):
+        """Initialize the coordinator."""
+        self.hass = hass
+        self.device = device
+        self.update_interval = update_interval
+        self.slow_update_interval = slow_update_interval
+        self._listeners = {}
+        self._unsub_refresh = None
+        self._unsub_confirm = None
+        self._stopped = False
+        self._failures = 0
+        self._started = None
+        self._first_refresh_done = False
+        self._last_slow = None
+        self._runs = {"fast": 0, "slow": 0}
+        self._saved = {"fast": 0, "slow": 0}
+        self._refreshing = False
+        self._refresh_idle = asyncio.Event()
+        self._refresh_idle.set()
+        self._refresh_pending = False
+        self._playlist_due = False
+        self._cycles = {"skipped": 0, "overrun": 0, "deferred": 0}
+        self._carried = {}
+        self._deferrals = Counter()
+        self._field_changes = Counter()
+        self._writes = {"written": 0, "suppressed": 0}
+        self.breaker = FhwiseCircuitBreaker(device.unique_id)
+        self._store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{device.unique_id}")
+        device.set_update_callback(self._async_device_updated)
+
+    @callback
+    def async_add_listener(self, area, update_callback):
+        """Listen for changes of an area, return a remove function."""
+        key = object()
+        self._listeners[key] = (area, update_callback, self.device.state_slice(area))
+
+        @callback
+        def remove_listener():
+            self._listeners.pop(key, None)
+
+        return remove_listener
+
+    @callback
+    def async_update_listeners(self):
+        """Call the listeners whose slice of state changed."""
+        for key, (area, update_callback, last) in list(self._listeners.items()):
+            current = self.device.state_slice(area)
+            changed = changed_fields(last, current)
+            if not changed:
+                continue
+            self._field_changes.update(changed)
+            _LOGGER.debug(f"Area {area} of {self.device.unique_id} changed {changed}")
+            self._listeners[key] = (area, update_callback, current)
+            update_callback()
+
+    @callback
+    def _async_device_updated(self):
+        """Fan out a change made outside a refresh and store it."""
+        self.async_update_listeners()
+        self._store.async_delay_save(self.device.as_dict, STORAGE_SAVE_DELAY)
+
+    @property
+    def effective_interval(self):
+        """Return the interval until the next scheduled refresh."""
+        device = self.device
+        if not device.available:
+            return min(
+                self.update_interval * 2 ** min(self._failures, 16),
+                MAX_UNAVAILABLE_INTERVAL,
+            )
+        if device.all_areas_off:
+            return max(self.update_interval, IDLE_UPDATE_INTERVAL)
+        if device.play_state != STATE_PLAYING:
+            return self.update_interval * PAUSED_INTERVAL_FACTOR
+        return self.update_interval
+
+    @callback
+    def _schedule_refresh(self, delay):
+        """Schedule the next refresh in delay seconds."""
+        if self._unsub_refresh is not None:
+            self._unsub_refresh()
+        self._unsub_refresh = async_call_later(
+            self.hass, delay, self._async_scheduled_refresh
+        )
+
+    async def _async_scheduled_refresh(self, *_):
+        """Refresh, then schedule the next refresh."""
+        self._unsub_refresh = None
+        await self.async_refresh()
+        if not self._first_refresh_done:
+            self._first_refresh_done = True
+            _LOGGER.info(
+                f"First refresh of {self.device.unique_id} done "
+                f"{self.device.metrics.record_setup('first_refresh')}s after setup"
+            )
+        # Skipped behind a running refresh, or a merged one is scheduled
+        if self._stopped or self._refreshing or self._unsub_refresh is not None:
+            return
+        self._failures = 0 if self.device.available else self._failures + 1
+        self._schedule_refresh(self.effective_interval.total_seconds())
+
+    async def async_refresh_now(self):
+        """Refresh both tiers and wait for it, as a service needs fresh state.
+
+        A running refresh is waited for first, so the two never overlap on
+        the connection; the guard and circuit breaker apply as usual.
+        """
+        while self._refreshing:
+            await self._refresh_idle.wait()
+        self._last_slow = None
+        await self.async_refresh()
+
+    @callback
+    def async_request_refresh(self):
+        """Refresh soon, after a command."""
+        if not self._stopped:
+            self._schedule_refresh(REQUEST_REFRESH_DELAY)
+
+    @callback
+    def async_command_sent(self):
+        """Fan out the optimistic state of a command and confirm it."""
+        self.async_update_listeners()
+        if self._stopped:
+            return
+        if self._unsub_confirm is not None:
+            self._unsub_confirm()
+        self._unsub_confirm = async_call_later(
+            self.hass, REQUEST_REFRESH_DELAY, self._async_confirm
+        )
+
+    async def _async_confirm(self, *_):
+        """Read back what commands wrote, refreshing when that failed."""
+        self._unsub_confirm = None
+        if not await self.device.async_confirm():
+            self.async_request_refresh()
+        self.async_update_listeners()
+
+    @property
+    def tier_stats(self):
+        """Return runs, calls per run and calls saved per minute by tier."""
+        minutes = max((time.monotonic() - self._started) / 60, 1 / 60)
+        return {
+            tier: {
+                "runs": self._runs[tier],
+                "calls": self.device.tier_calls[tier],
+                "saved_per_minute": round(self._saved[tier] / minutes, 1),
+            }
+            for tier in ("fast", "slow")
+        }
+
+    @property
+    def field_changes(self):
+        """Return how often each state field triggered an entity write."""
+        return dict(self._field_changes)
+
+    @property
+    def write_stats(self):
+        """Return the number of entity state writes done and suppressed."""
+        return dict(self._writes)
+
+    @callback
+    def record_write(self, suppressed):
+        """Count an entity state write, or one skipped as unchanged."""
+        self._writes["suppressed" if suppressed else "written"] += 1
+
+    @property
+    def cycle_stats(self):
+        """Return the number of skipped, overrun and deferred cycles."""
+        return dict(self._cycles)
+
+    def _slow_due(self):
+        """Return true when the slow tier has to run."""
+        if self._last_slow is None or self.device.slow_stale:
+            return True
+        elapsed = time.monotonic() - self._last_slow
+        return elapsed >= self.slow_update_interval.total_seconds()
+
+    async def async_refresh(self, *_):
+        """Refresh the due tiers and fan out the changes.
+
+        While a refresh runs, further calls only ask for one more refresh
+        after it.
+        """
+        if self._refreshing:
+            self._cycles["skipped"] += 1
+            self._refresh_pending = True
+            return
+        self._refreshing = True
+        self._refresh_idle.clear()
+        self._refresh_pending = False
+        token = request_priority.set(PRIORITY_POLL)
+        try:
+            await self._async_refresh_tiers()
+        finally:
+            request_priority.reset(token)
+            self._refreshing = False
+            self._refresh_idle.set()
+        self.async_update_listeners()
+        if self._refresh_pending:
+            self.async_request_refresh()
+
+    async def _async_step(self, step, coro, deadline):
+        """Run a deferrable step until deadline, return true when it finished.
+
+        A step out of budget keeps running and the next cycle waits for it
+        again, so its progress is not lost. That carried over run, and a
+        step deferred MAX_STEP_DEFERRALS times in a row, get up to one
+        update interval regardless of the deadline.
+        """
+        task = self._carried.pop(step, None)
+        if task is not None:
+            coro.close()
+            remaining = self.update_interval.total_seconds()
+        elif self._deferrals[step] >= MAX_STEP_DEFERRALS:
+            remaining = self.update_interval.total_seconds()
+        else:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                coro.close()
+                self._deferrals[step] += 1
+                self._cycles["deferred"] += 1
+                return False
+        del self._deferrals[step]
+        if task is None:
+            task = asyncio.create_task(coro)
+        try:
+            await asyncio.wait_for(asyncio.shield(task), remaining)
+        except asyncio.TimeoutError:
+            self._carried[step] = task
+            self._cycles["overrun"] += 1
+            _LOGGER.debug(
+                f"Refresh step {step} of {self.device.unique_id} ran out of budget"
+            )
+            return False
+        return True
+
+    async def _async_refresh_tiers(self):
+        """Refresh the fast tier and, when due, the slow tier."""
+        state = self.breaker.state
+        if state == STATE_OPEN:
+            self.breaker.skipped += 1
+            return
+        if state == STATE_HALF_OPEN and not await self.device.async_probe():
+            self.breaker.record_failure()
+            return
+
+        start = time.monotonic()
+        budget = self.update_interval.total_seconds() * REFRESH_BUDGET_FACTOR
+        deadlines = {
+            step: start + budget * share for step, share in STEP_DEADLINES.items()
+        }
+
+        await self.device.async_update_fast()
+        self._runs["fast"] += 1
+        self._saved["fast"] += self.device.fast_skipped
+        if time.monotonic() > deadlines["fast"]:
+            self._cycles["overrun"] += 1
+        if not self.device.reachable:
+            self.breaker.record_failure()
+            return
+        self.breaker.record_success()
+
+        if self._slow_due():
+            if await self._async_step(
+                "slow", self.device.async_update_settings(), deadlines["slow"]
+            ):
+                self._runs["slow"] += 1
+                self._last_slow = time.monotonic()
+                self._playlist_due = True
+        else:
+            # What the old single pass would have spent on this tick
+            self._saved["slow"] += self.device.tier_calls["slow"]
+
+        if self._playlist_due and self.device.reachable:
+            if await self._async_step(
+                "playlist", self.device.async_update_playlist(), deadlines["playlist"]
+            ):
+                self._playlist_due = False
+                if self.device.reachable:
+                    self._store.async_delay_save(
+                        self.device.as_dict, STORAGE_SAVE_DELAY
+                    )
+
+    async def async_start(self):
+        """Restore stored state and start refreshing in the background."""
+        self._started = time.monotonic()
+        stored = await self._store.async_load()
+        if stored:
+            self.device.restore(stored)
+        self.hass.async_create_task(self._async_scheduled_refresh())
+
+    @callback
+    def async_stop(self):
+        """Stop the scheduled refresh, carried over steps and playlist download."""
+        self._stopped = True
+        if self._unsub_refresh is not None:
+            self._unsub_refresh()
+            self._unsub_refresh = None
+        if self._unsub_confirm is not None:
+            self._unsub_confirm()
+            self._unsub_confirm = None
+        for task in self._carried.values():
+            task.cancel()
+        self._carried.clear()
+        self.device.stop()
@@ -0,0 +1,37 @@
+"""Diagnostics of a fhwise config entry."""
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.const import CONF_HOST
+
+from .const import (
+    DOMAIN,
+    FHWISE_COORDINATOR,
+    FHWISE_METRICS,
+    FHWISE_MODEL,
+    FHWISE_OBJECT,
+)
+
+TO_REDACT = {CONF_HOST}
+
+
+async def async_get_config_entry_diagnostics(hass, config_entry):
+    """Return command metrics, refresh phases and scheduler state."""
+    entry_data = hass.data[DOMAIN][config_entry.entry_id]
+    connection = entry_data[FHWISE_OBJECT]
+    diagnostics = {
+        "entry": async_redact_data(dict(config_entry.data), TO_REDACT),
+        "model": entry_data[FHWISE_MODEL],
+        "connected": connection.connected,
+        "request_latency": connection.scheduler.latency_stats,
+        "metrics": entry_data[FHWISE_METRICS].as_dict(),
+    }
+    coordinator = entry_data.get(FHWISE_COORDINATOR)
+    if coordinator is not None:
+        diagnostics["refresh_tiers"] = coordinator.tier_stats
+        diagnostics["refresh_cycles"] = coordinator.cycle_stats
+        diagnostics["field_changes"] = coordinator.field_changes
+        diagnostics["state_writes"] = coordinator.write_stats
+        diagnostics["stale_reads"] = dict(coordinator.device.stale_reads)
+        diagnostics["playlist_progress"] = list(coordinator.device.playlist_progress)
+        diagnostics["breaker"] = coordinator.breaker.as_dict()
+        diagnostics["poll_interval"] = coordinator.effective_interval.total_seconds()
+    return diagnostics
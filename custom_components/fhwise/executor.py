@@ -0,0 +1,78 @@
+"""Per-device executor for the blocking fhwise player calls."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import logging
+import threading
+
+from .transport import FhwiseTransport
+
+_LOGGER = logging.getLogger(__name__)
+
+# FhwisePlayer binds the local UDP port equal to the device port on every
+# call, so two devices sharing a port must never talk at the same time.
+_PORT_LOCKS = {}
+_PORT_LOCKS_GUARD = threading.Lock()
+
+DEFAULT_MAX_PENDING = 32
+
+
+def _port_lock(port):
+    """Return the process wide lock guarding a local UDP port."""
+    with _PORT_LOCKS_GUARD:
+        return _PORT_LOCKS.setdefault(port, threading.Lock())
+
+
+class FhwiseDeviceExecutor:
+    """Run blocking player calls on a single worker thread per device.
+
+    One worker keeps the request/response ordering the device needs, and
+    the pending queue is bounded so a dead device can not pile up work.
+    """
+
+    def __init__(self, host, port, max_pending=DEFAULT_MAX_PENDING):
+        """Initialize the executor."""
+        self._host = host
+        self._port = port
+        self._lock = _port_lock(port)
+        self._pending = asyncio.Semaphore(max_pending)
+        self._pool = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"fhwise-{host}:{port}"
+        )
+
+    def _call(self, func, *args, **kwargs):
+        """Run func while holding the local port."""
+        with self._lock:
+            return func(*args, **kwargs)
+
+    async def async_run(self, func, *args, **kwargs):
+        """Run a blocking player call off the event loop."""
+        async with self._pending:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._pool, partial(self._call, func, *args, **kwargs)
+            )
+
+    def shutdown(self):
+        """Stop the worker thread."""
+        _LOGGER.debug(f"Shutting down executor for {self._host}:{self._port}")
+        self._pool.shutdown(wait=False)
+
+
+class FhwiseExecutorTransport(FhwiseTransport):
+    """Fallback backend running the blocking FhwisePlayer on its executor."""
+
+    def __init__(self, player, executor=None):
+        """Initialize the transport."""
+        self.host = player.addr
+        self.port = player.port
+        self._player = player
+        self._executor = executor or FhwiseDeviceExecutor(self.host, self.port)
+
+    async def async_stop(self):
+        """Stop the worker thread."""
+        self._executor.shutdown()
+
+    async def async_call(self, command, *args):
+        """Run the matching FhwisePlayer method on the worker thread."""
+        return await self._executor.async_run(getattr(self._player, command), *args)
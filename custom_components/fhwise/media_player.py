@@ -1,20 +1,33 @@
 """The implementation of fhwise media player."""
+import asyncio
 import logging
+import time
 
+from collections import Counter
 from datetime import timedelta
+from functools import partial
 import voluptuous as vol
-import traceback
 
-from homeassistant.components.media_player import MediaPlayerEntity
+from homeassistant.components.media_player import BrowseMedia, MediaPlayerEntity
 from homeassistant.components.media_player.const import (
+    ATTR_MEDIA_VOLUME_LEVEL,
+    MEDIA_CLASS_DIRECTORY,
+    MEDIA_CLASS_TRACK,
     MEDIA_TYPE_MUSIC,
+    MEDIA_TYPE_PLAYLIST,
+    REPEAT_MODE_ALL,
+    REPEAT_MODE_OFF,
+    REPEAT_MODE_ONE,
     SUPPORT_TURN_ON,
     SUPPORT_TURN_OFF,
+    SUPPORT_BROWSE_MEDIA,
     SUPPORT_CLEAR_PLAYLIST,
     SUPPORT_NEXT_TRACK,
     SUPPORT_PAUSE,
     SUPPORT_PLAY,
+    SUPPORT_PLAY_MEDIA,
     SUPPORT_PREVIOUS_TRACK,
+    SUPPORT_REPEAT_SET,
     SUPPORT_SEEK,
     SUPPORT_SELECT_SOUND_MODE,
     SUPPORT_SELECT_SOURCE,
@@ -23,23 +36,40 @@ from homeassistant.components.media_player.const import (
     SUPPORT_VOLUME_SET,
     SUPPORT_VOLUME_STEP,
 )
+from homeassistant.components.media_player.errors import BrowseError
 from homeassistant.const import (
     CONF_HOST,
     CONF_NAME,
     CONF_PORT,
+    CONF_SCAN_INTERVAL,
     STATE_OFF,
     STATE_PAUSED,
     STATE_PLAYING,
 )
-from homeassistant.exceptions import PlatformNotReady
+from homeassistant.core import callback
+from homeassistant.exceptions import HomeAssistantError, PlatformNotReady
 import homeassistant.helpers.config_validation as cv
-from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers import entity_platform
 import homeassistant.util.dt as dt_util
 from .const import (
+    CONF_INTERPOLATE_POSITION,
+    CONF_SLOW_SCAN_INTERVAL,
     DOMAIN,
+    FHWISE_COORDINATOR,
+    FHWISE_METRICS,
+    FHWISE_MODEL,
     FHWISE_OBJECT,
 )
-from fhwise import FhwisePlayer
+from .connection import async_get_connection
+from .metrics import FhwiseMetrics
+from .model import FhwiseArea
+from .playlist import FhwisePlaylist
+from .scheduler import FhwiseWriteCoalescer
+from .coordinator import (
+    DEFAULT_SLOW_UPDATE_INTERVAL,
+    DEFAULT_UPDATE_INTERVAL,
+    FhwiseCoordinator,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -51,16 +81,44 @@ PLATFORM_SCHEMA = cv.PLATFORM_SCHEMA_BASE.extend(
         vol.Required(CONF_HOST): cv.string,
         vol.Optional(CONF_PORT, default=DEFAULT_PORT): cv.port,
         vol.Optional(CONF_NAME, default=DEFAULT_NAME): cv.string,
+        vol.Optional(
+            CONF_SCAN_INTERVAL, default=DEFAULT_UPDATE_INTERVAL
+        ): cv.time_period,
+        vol.Optional(
+            CONF_SLOW_SCAN_INTERVAL, default=DEFAULT_SLOW_UPDATE_INTERVAL
+        ): cv.time_period,
+        vol.Optional(CONF_INTERPOLATE_POSITION, default=True): cv.boolean,
     }
 )
 
 ATTR_MODEL = "model"
 ATTR_AREA = "area"
+ATTR_AREAS = "areas"
+ATTR_POWER = "power"
+ATTR_REFRESH_TIERS = "refresh_tiers"
+ATTR_REFRESH_CYCLES = "refresh_cycles"
+ATTR_POLL_INTERVAL = "poll_interval"
+ATTR_REQUEST_LATENCY = "request_latency"
+ATTR_STATE_WRITES = "state_writes"
+ATTR_PLAYLIST_PROGRESS = "playlist_progress"
 MODEL_WLBM209 = "WISE-WLBM209-FLS101"
 SUPPORT_4_AREA_MODELS = [MODEL_WLBM209]
 
 SUPPORT_AREA_MODELS = SUPPORT_4_AREA_MODELS
 
+# Position interpolation, ms of drift tolerated and seconds between reads
+POSITION_DRIFT_THRESHOLD = 2000
+POSITION_SYNC_INTERVAL = 60
+# Seconds of position change an entity state write waits for
+POSITION_BUCKET = 5
+# Refresh statistics attributes are rewritten at most this often, in
+# seconds, and the playlist progress in this many steps
+STATS_WRITE_INTERVAL = 60
+PLAYLIST_PROGRESS_STEPS = 10
+
+# Seconds a device stays available after its last successful refresh
+UNAVAILABLE_GRACE = 15
+
 SOUND_MODE_NORMAL = "Normal"
 SOUND_MODE_ROCK = "Rock"
 SOUND_MODE_POP = "Pop"
@@ -111,6 +169,51 @@ PLAY_MODE_LIST = [
     PLAY_MODE_RANDOM,  # 3
 ]
 DEFAULT_PLAY_MODE = PLAY_MODE_SEQ
+MAX_PLAY_MODE_ATTEMPTS = 2
+
+PLAY_MODE_TO_REPEAT = {
+    PLAY_MODE_REPEAT_ALL: REPEAT_MODE_ALL,
+    PLAY_MODE_REPEAT_ONE: REPEAT_MODE_ONE,
+}
+REPEAT_TO_PLAY_MODE = {
+    REPEAT_MODE_ALL: PLAY_MODE_REPEAT_ALL,
+    REPEAT_MODE_ONE: PLAY_MODE_REPEAT_ONE,
+}
+
+# Media browser content ids: the root lists pages, pages list tracks
+BROWSE_ROOT = "playlist"
+BROWSE_PAGE = "page:"
+BROWSE_TRACK = "track:"
+
+# Fields a command writes, stamped with a version so older reads are dropped
+FIELD_PLAY_STATE = "play_state"
+FIELD_MUTED = "muted"
+FIELD_TRACK = "track"
+FIELD_POSITION = "position"
+FIELD_SOUND_MODE = "sound_mode"
+FIELD_SOURCE = "source"
+FIELD_PLAY_MODE = "play_mode"
+FIELD_AREA = "area:"
+
+SERVICE_RESTORE = "restore"
+SERVICE_SET_AREAS = "set_areas"
+SERVICE_SNAPSHOT = "snapshot"
+SET_AREAS_SCHEMA = {
+    vol.Required(ATTR_AREAS): vol.All(
+        cv.ensure_list,
+        [
+            vol.Schema(
+                {
+                    vol.Required(ATTR_AREA): vol.All(
+                        vol.Coerce(int), vol.Range(min=1, max=4)
+                    ),
+                    vol.Optional(ATTR_MEDIA_VOLUME_LEVEL): cv.small_float,
+                    vol.Optional(ATTR_POWER): cv.boolean,
+                }
+            )
+        ],
+    )
+}
 
 MUSIC_PLAYER_SUPPORT = (
     SUPPORT_PAUSE
@@ -123,10 +226,13 @@ MUSIC_PLAYER_SUPPORT = (
     | SUPPORT_SELECT_SOURCE
     | SUPPORT_PLAY
     | SUPPORT_SHUFFLE_SET
+    | SUPPORT_REPEAT_SET
     | SUPPORT_VOLUME_STEP
     | SUPPORT_PREVIOUS_TRACK
     | SUPPORT_NEXT_TRACK
     | SUPPORT_SELECT_SOUND_MODE
+    | SUPPORT_BROWSE_MEDIA
+    | SUPPORT_PLAY_MEDIA
 )
 
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
@@ -135,80 +241,198 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
     port = config[CONF_PORT]
     host = config[CONF_HOST]
     name = config[CONF_NAME]
-    device = None
-    fhPlayer = FhwisePlayer(host, port)
+    devices = []
+    metrics = FhwiseMetrics()
     _LOGGER.info(f"Initializing with {host}:{port}")
 
     try:
-        fhPlayer.connect()
-        model = fhPlayer.send_heartbeat()
-        fhPlayer.disconnect()
-        _LOGGER.info(f"{model} detected")
+        fhPlayer = await async_get_connection(hass, host, port)
+        model = fhPlayer.model
+        _LOGGER.info(f"{model} detected in {metrics.record_setup('connected')}s")
     except Exception as err:
         _LOGGER.error(f"Error connecting to fhwise at {host}:{port}")
         raise PlatformNotReady from err
 
-    await fhPlayerDevice.async_update()
-    async_track_time_interval(
-        hass, fhPlayerDevice.async_update, timedelta(seconds=5)
+    fhPlayerDevice = FhwiseMusicPlayerDevice(
+        fhPlayer, host, port, model, config[CONF_INTERPOLATE_POSITION], metrics
     )
+    coordinator = FhwiseCoordinator(
+        hass,
+        fhPlayerDevice,
+        config[CONF_SCAN_INTERVAL],
+        config[CONF_SLOW_SCAN_INTERVAL],
+    )
+    await coordinator.async_start()
 
-    devices.append(FhwiseMusicPlayer(fhPlayerDevice, name))
+    devices.append(FhwiseMusicPlayer(coordinator, name))
     for i in range(fhPlayerDevice.supported_area_num):
-        devices.append(FhwiseMusicPlayer(fhPlayerDevice, name, i+1))
+        devices.append(FhwiseMusicPlayer(coordinator, name, i+1))
 
-    async_add_entities(devices, update_before_add=True)
+    async_add_entities(devices)
+    _async_register_services()
+    _LOGGER.info(
+        f"{host} ready after {metrics.record_setup('entities')}s"
+    )
 
 async def async_setup_entry(hass, config_entry, async_add_entities):
     """Set up the fhwise platform."""
     port = config_entry.data[CONF_PORT]
-    host = config_entry.data(CONF_HOST)
-    name = config_entry.data(CONF_NAME)
+    host = config_entry.data[CONF_HOST]
+    name = config_entry.data[CONF_NAME]
     devices = []
 
-    fhPlayer = hass.data[DOMAIN][config_entry.entry_id][FHWISE_OBJECT]
+    entry_data = hass.data[DOMAIN][config_entry.entry_id]
+    fhPlayer = entry_data[FHWISE_OBJECT]
+    model = entry_data[FHWISE_MODEL]
+
+    fhPlayerDevice = FhwiseMusicPlayerDevice(
+        fhPlayer,
+        host,
+        port,
+        model,
+        config_entry.options.get(CONF_INTERPOLATE_POSITION, True),
+        entry_data[FHWISE_METRICS],
+    )
+    coordinator = FhwiseCoordinator(
+        hass,
+        fhPlayerDevice,
+        timedelta(
+            seconds=config_entry.options.get(
+                CONF_SCAN_INTERVAL, DEFAULT_UPDATE_INTERVAL.total_seconds()
+            )
+        ),
+        timedelta(
+            seconds=config_entry.options.get(
+                CONF_SLOW_SCAN_INTERVAL,
+                DEFAULT_SLOW_UPDATE_INTERVAL.total_seconds(),
+            )
+        ),
+    )
+    await coordinator.async_start()
+    config_entry.async_on_unload(coordinator.async_stop)
+    entry_data[FHWISE_COORDINATOR] = coordinator
 
-    model = fhPlayer.send_heartbeat()
+    devices.append(FhwiseMusicPlayer(coordinator, name))
+    for i in range(fhPlayerDevice.supported_area_num):
+        devices.append(FhwiseMusicPlayer(coordinator, name, i+1))
 
-    fhPlayerDevice = FhwiseMusicPlayerDevice(fhPlayer, host, port, model)
-    await fhPlayerDevice.async_update()
-    async_track_time_interval(
-        hass, fhPlayerDevice.async_update, timedelta(seconds=5)
+    async_add_entities(devices)
+    _async_register_services()
+    _LOGGER.info(
+        f"{host} ready after {entry_data[FHWISE_METRICS].record_setup('entities')}s"
     )
 
-    devices.append(FhwiseMusicPlayer(fhPlayerDevice, name))
-    for i in range(fhPlayerDevice.supported_area_num):
-        devices.append(FhwiseMusicPlayer(fhPlayerDevice, name, i+1))
 
-    async_add_entities(devices, update_before_add=True)
+@callback
+def _async_register_services():
+    """Register the entity services of the platform."""
+    platform = entity_platform.async_get_current_platform()
+    platform.async_register_entity_service(
+        SERVICE_SET_AREAS, SET_AREAS_SCHEMA, "async_set_areas"
+    )
+    platform.async_register_entity_service(SERVICE_SNAPSHOT, {}, "async_snapshot")
+    platform.async_register_entity_service(SERVICE_RESTORE, {}, "async_restore")
 
 
 class FhwiseMusicPlayerDevice:
     """A fhwise media player that only supports music."""
 
-    tracks = []
-
-    def __init__(self, player, host, port, model):
+    def __init__(
+        self, player, host, port, model, interpolate_position=True, metrics=None
+    ):
         """Initialize the demo device."""
         self._player = player
+        self._interpolate_position = interpolate_position
         self._host = host
         self._port = port
         self._model = model
 
         self._player_state = STATE_PAUSED
         self._available = False
+        self._last_seen = None
         self._play_mode = DEFAULT_PLAY_MODE
         self._sound_mode = DEFAULT_SOUND_MODE
         self._source = DEFAULT_SOURCE
         self._cur_track = 0
+        self._cur_track_name = None
         self._cur_track_pos = 0
         self._cur_track_len = 0
+        self._list_count = 0
         self._cur_area_name = ""
         self._cur_area_id = ""
         self._volume_muted = False
         self._media_position_updated_at = None
+        self._position_stale = True
+        self._last_position_sync = 0
+
+        # Entities render before the first refresh, so every area exists
+        self._area_state = {"0": FhwiseArea(state=True)}
+        for i in range(self.supported_area_num):
+            self._area_state[f"{i + 1}"] = FhwiseArea()
+
+        self._playlist = FhwisePlaylist()
+        self._update_callback = None
+        self._coalescer = FhwiseWriteCoalescer()
+        self._snapshot = None
+        self._slow_stale = True
+        self._version = 0
+        self._versions = {}
+        self._unconfirmed = set()
+        self.stale_reads = Counter()
+        self.calls = 0
+        self.tier_calls = {"fast": 0, "slow": 0}
+        # Reads the last fast tier left out, the interpolated position
+        self.fast_skipped = 0
+        self.metrics = FhwiseMetrics() if metrics is None else metrics
+
+    def set_update_callback(self, update_callback):
+        """Call update_callback when state changes outside a refresh."""
+        self._update_callback = update_callback
+
+    def _stamp(self, *fields):
+        """Mark fields as written by a command, to be confirmed."""
+        self._version += 1
+        for field in fields:
+            self._versions[field] = self._version
+        self._unconfirmed.update(fields)
+
+    def _fresh(self, field, version):
+        """Return true when no command wrote field since version was taken.
+
+        A read issued before a command may return the old value, storing
+        it would undo the optimistic state until the next refresh. So does
+        any read while a coalesced write of the field is still pending.
+        """
+        pending = self._coalescer.pending(field)
+        if not pending and self._versions.get(field, 0) <= version:
+            return True
+        self.stale_reads[field] += 1
+        _LOGGER.debug(f"Dropped {field} of {self._host} read before a command")
+        return False
+
+    @property
+    def tracks(self):
+        """Return the cached playlist, a FhwiseTrackTable."""
+        return self._playlist.tracks
+
+    @property
+    def list_count(self):
+        """Return the length of the device list."""
+        return self._list_count or len(self.tracks)
+
+    @property
+    def page_size(self):
+        """Return the number of tracks per browse page."""
+        return self._playlist.page_size
 
-        self._area_state = {}
+    @property
+    def playlist_progress(self):
+        """Return (loaded, total) of the playlist download."""
+        return self._playlist.progress
+
+    def stop(self):
+        """Stop background work, the playlist download."""
+        self._playlist.cancel()
 
     @property
     def supported_area(self):
@@ -233,14 +457,29 @@ class FhwiseMusicPlayerDevice:
         return self._model
 
     @property
-    def available(self):
-        """Docstring."""
+    def reachable(self):
+        """Return true when the last device call succeeded."""
         return self._available
 
+    @property
+    def available(self):
+        """Return true when reachable or seen within the grace period."""
+        if self._available:
+            return True
+        return (
+            self._last_seen is not None
+            and time.monotonic() - self._last_seen < UNAVAILABLE_GRACE
+        )
+
     @property
     def shuffle(self):
         """Docstring."""
-        return self._play_mode is PLAY_MODE_RANDOM
+        return self._play_mode == PLAY_MODE_RANDOM
+
+    @property
+    def repeat(self):
+        """Return the HA repeat mode of the play mode."""
+        return PLAY_MODE_TO_REPEAT.get(self._play_mode, REPEAT_MODE_OFF)
 
     @property
     def sound_mode(self):
@@ -272,15 +511,32 @@ class FhwiseMusicPlayerDevice:
         """Last valid time of media position."""
         return self._media_position_updated_at
 
+    @property
+    def position_bucket(self):
+        """Return the position rounded to POSITION_BUCKET seconds.
+
+        While playing HA extrapolates the position from its timestamp, so
+        the bucket is of the time the track started: a read that agrees
+        with the extrapolation keeps it, a seek or drift moves it.
+        """
+        position = self._cur_track_pos / 1000
+        if self._player_state == STATE_PLAYING and self._media_position_updated_at:
+            position = self._media_position_updated_at.timestamp() - position
+        return round(position / POSITION_BUCKET)
+
     @property
     def current_title(self):
         """Return the title of current playing media."""
-        return self.tracks[self._cur_track][1] if self.tracks else ""
+        if self._cur_track < len(self.tracks):
+            return self.tracks.title(self._cur_track)
+        return ""
 
     @property
     def current_artist(self):
         """Return the artist of current playing media (Music track only)."""
-        return self.tracks[self._cur_track][0] if self.tracks else ""
+        if self._cur_track < len(self.tracks):
+            return self.tracks.artist(self._cur_track)
+        return ""
 
     @property
     def current_area_id(self):
@@ -289,9 +545,24 @@ class FhwiseMusicPlayerDevice:
 
     @property
     def area_state(self):
-        """Docstring."""
+        """Return the FhwiseArea of every area id, "0" is the main volume."""
         return self._area_state
 
+    @property
+    def latency_stats(self):
+        """Return p50/p99 request latency by priority."""
+        return self._player.scheduler.latency_stats
+
+    @property
+    def all_areas_off(self):
+        """Return true when the model has areas and all are off."""
+        areas = [
+            state
+            for area, state in self._area_state.items()
+            if area != "0"
+        ]
+        return bool(areas) and not any(state.state for state in areas)
+
     @property
     def play_state(self):
         """Docstring."""
@@ -302,44 +573,152 @@ class FhwiseMusicPlayerDevice:
         """Docstring."""
         return self._volume_muted
 
+    @property
+    def slow_stale(self):
+        """Return true when a command changed a slow tier setting."""
+        return self._slow_stale
+
+    def state_slice(self, area):
+        """Return the part of the state an area entity renders.
+
+        The fields are named by model.SLICE_FIELDS.
+        """
+        area_state = self._area_state.get(area)
+        return (
+            self.available,
+            self._player_state,
+            area_state and area_state.volume,
+            area_state and area_state.state,
+            self._volume_muted,
+            self._play_mode,
+            self._sound_mode,
+            self._source,
+            self._cur_track,
+            self.current_title,
+            self.current_artist,
+            self._cur_track_len,
+            self._cur_track_pos,
+            self._media_position_updated_at,
+        )
+
+    def as_dict(self):
+        """Return the state worth keeping across restarts."""
+        return {
+            "play_mode": self._play_mode,
+            "sound_mode": self._sound_mode,
+            "source": self._source,
+            "area_state": {
+                area: state.as_dict() for area, state in self._area_state.items()
+            },
+            "cur_track": self._cur_track,
+            "cur_track_name": self._cur_track_name,
+            "cur_track_len": self._cur_track_len,
+            "tracks": self._playlist.as_list(),
+        }
+
+    def restore(self, data):
+        """Serve stored state until the device answers."""
+        self._play_mode = data.get("play_mode", self._play_mode)
+        self._sound_mode = data.get("sound_mode", self._sound_mode)
+        self._source = data.get("source", self._source)
+        for area, state in data.get("area_state", {}).items():
+            self._area_state[area] = FhwiseArea.from_dict(state)
+        self._cur_track = data.get("cur_track", self._cur_track)
+        self._cur_track_name = data.get("cur_track_name", self._cur_track_name)
+        self._cur_track_len = data.get("cur_track_len", self._cur_track_len)
+        self._playlist.restore(data.get("tracks", []))
+        self._available = True
+
     async def _try_command(self, mask_error, func, *args, **kwargs):
         """Call a player command handling error messages."""
+        self.calls += 1
+        start = time.monotonic()
         try:
-            # result = await self.hass.async_add_executor_job(
-            #    partial(func, *args, **kwargs)
-            # )
-            result = func(*args, **kwargs)
+            result = await func(*args, **kwargs)
+            self.metrics.record(func.__name__, (time.monotonic() - start) * 1000)
             _LOGGER.debug(f"Response received from player: {result}")
             return result
-        except Exception:
-            _LOGGER.error(mask_error)
+        except Exception as err:
+            self.metrics.record(func.__name__, (time.monotonic() - start) * 1000, err)
+            _LOGGER.debug(f"{mask_error} {err!r}")
             self._available = False
-            raise Exception
+            raise Exception(mask_error) from err
+
+    async def async_probe(self):
+        """Send a single heartbeat, return true when the device answered."""
+        start = time.monotonic()
+        try:
+            await self._player.send_heartbeat()
+        except Exception as err:
+            elapsed = (time.monotonic() - start) * 1000
+            self.metrics.record("send_heartbeat", elapsed, err)
+            _LOGGER.debug(f"Heartbeat to {self._host} failed: {err!r}")
+            return False
+        self.metrics.record("send_heartbeat", (time.monotonic() - start) * 1000)
+        return True
 
     async def async_set_play_mode(self, mode):
-        """Docstring."""
+        """Step the device play mode to mode.
+
+        The device only cycles through PLAY_MODE_LIST, so the number of
+        toggles is known from the current mode. They are sent back to back
+        and the result is always read back, even when a toggle failed; a
+        device that did not end up in mode gets one more attempt.
+        """
         if mode not in PLAY_MODE_LIST:
             _LOGGER.error(f"play mode {mode} not support")
             return
 
-        result = await self._try_command(
+        target = PLAY_MODE_LIST.index(mode)
+        current = await self._try_command(
             "Get play mode failed", self._player.get_play_mode
         )
-        if PLAY_MODE_LIST[result] == mode:
-            return
+        for _ in range(MAX_PLAY_MODE_ATTEMPTS):
+            if current == target:
+                break
+            toggles = (target - current) % len(PLAY_MODE_LIST)
+            results = await asyncio.gather(
+                *[
+                    self._try_command(
+                        "Toggle play mode failed", self._player.set_toggle_play_mode
+                    )
+                    for _ in range(toggles)
+                ],
+                return_exceptions=True,
+            )
+            # A lost toggle shows in the read back and is retried from there
+            for result in results:
+                if isinstance(result, Exception):
+                    _LOGGER.warning(f"{result} on {self._host}: {result.__cause__!r}")
+            current = await self._try_command(
+                "Get play mode failed", self._player.get_play_mode
+            )
 
-        while True:
-            result = await self._try_command(
-                "Toggle play mode failed", self._player.set_toggle_play_mode
+        # Whatever was read last is what the device plays now, and the
+        # answered read back means a failed toggle did not lose the device
+        self._available = True
+        self._play_mode = PLAY_MODE_LIST[current]
+        self._stamp(FIELD_PLAY_MODE)
+        if current != target:
+            raise HomeAssistantError(
+                f"Play mode of {self._host} reads {self._play_mode} "
+                f"after {MAX_PLAY_MODE_ATTEMPTS} attempts to set {mode}"
             )
-            if PLAY_MODE_LIST[result] == mode:
-                return
 
     async def async_set_shuffle(self, shuffle):
         """Enable/disable shuffle mode."""
-        mode = PLAY_MODE_RANDOM if shuffle else PLAY_MODE_SEQ
-        await self.async_set_play_mode(mode)
-        self._play_mode = mode
+        if shuffle:
+            await self.async_set_play_mode(PLAY_MODE_RANDOM)
+        elif self._play_mode == PLAY_MODE_RANDOM:
+            await self.async_set_play_mode(PLAY_MODE_SEQ)
+
+    async def async_set_repeat(self, repeat):
+        """Set repeat mode, which replaces shuffle on this device."""
+        if repeat == REPEAT_MODE_OFF:
+            if self._play_mode != PLAY_MODE_RANDOM:
+                await self.async_set_play_mode(PLAY_MODE_SEQ)
+        else:
+            await self.async_set_play_mode(REPEAT_TO_PLAY_MODE[repeat])
 
     async def async_mute_volume(self, mute):
         """Mute the volume."""
@@ -348,9 +727,23 @@ class FhwiseMusicPlayerDevice:
                 "Mute the player failed.", self._player.set_volume_toggle_mute
             )
             self._volume_muted = mute
+            self._stamp(FIELD_MUTED)
 
     async def async_set_volume_level(self, volume, area_id):
-        """Set the volume level, range 0..1."""
+        """Set the volume level, range 0..15.
+
+        The new level is shown right away; rapid changes of the same area
+        are coalesced into a single device write of the last level.
+        """
+        self._area_state[area_id].volume = int(volume)
+        self._stamp(f"{FIELD_AREA}{area_id}")
+        self._async_optimistic_update()
+        await self._coalescer.async_write(
+            f"{FIELD_AREA}{area_id}", volume, partial(self._async_write_volume, area_id)
+        )
+
+    async def _async_write_volume(self, area_id, volume):
+        """Send a volume level to the device."""
         if area_id == "0":
             result = await self._try_command(
                 "Set volume level failed.",
@@ -367,14 +760,15 @@ class FhwiseMusicPlayerDevice:
                     self._player.set_volume_level,
                     int(volume),
                 )
-            self._area_state[area_id]["volume"] = int(volume)
+            self._area_state[area_id].volume = int(volume)
+            self._stamp(f"{FIELD_AREA}{area_id}")
         else:
             result = await self._try_command(
                 "Set sub area failed.",
                 self._player.set_sub_area_control,
                 int(area_id) - 1,
                 int(volume),
-                self._area_state[area_id]["state"],
+                self._area_state[area_id].state,
             )
             _LOGGER.debug(result)
             if volume != 0 and int(result.split("::")[1]) == 0:
@@ -386,9 +780,10 @@ class FhwiseMusicPlayerDevice:
                     self._player.set_sub_area_control,
                     int(area_id) - 1,
                     int(volume),
-                    self._area_state[area_id]["state"],
+                    self._area_state[area_id].state,
                 )
-            self._area_state[area_id]["volume"] = int(volume)
+            self._area_state[area_id].volume = int(volume)
+            self._stamp(f"{FIELD_AREA}{area_id}")
 
     async def async_media_play_pause(self):
         """Send play command."""
@@ -399,6 +794,8 @@ class FhwiseMusicPlayerDevice:
             self._player_state = STATE_PLAYING
         else:
             self._player_state = STATE_PAUSED
+        self._position_stale = True
+        self._stamp(FIELD_PLAY_STATE, FIELD_POSITION)
 
     async def async_media_on_off(self, area_id):
         """Send on/off command."""
@@ -406,14 +803,90 @@ class FhwiseMusicPlayerDevice:
             _LOGGER.info(f"{self._model} dose not support area, can not turn off.")
             return await self.async_media_play_pause()
         else:
+            area = self._area_state[area_id]
             await self._try_command(
                 "Set sub area failed.",
                 self._player.set_sub_area_control,
                 int(area_id) - 1,
-                self._area_state[area_id]["volume"],
-                not self._area_state[area_id]["state"],
+                area.volume,
+                not area.state,
             )
-            self._area_state[area_id]["state"] = not self._area_state[area_id]["state"]
+            area.state = not area.state
+            self._stamp(f"{FIELD_AREA}{area_id}")
+
+    def _store_area_info(self, info, version=None):
+        """Store a 'area::volume::on' reply of a sub area."""
+        area_info = info.split("::")
+        _LOGGER.debug(f"Got area info: {area_info}")
+        self._store_area(
+            f"{int(area_info[0])+1}", int(area_info[1]), area_info[2] != "0", version
+        )
+
+    def _store_area(self, area_id, volume, state, version=None):
+        """Update an area in place, creating it on first sight.
+
+        With a version, a read older than a command on the area is dropped.
+        """
+        if version is not None and not self._fresh(f"{FIELD_AREA}{area_id}", version):
+            return
+        area = self._area_state.get(area_id)
+        if area is None:
+            self._area_state[area_id] = FhwiseArea(volume, state)
+        else:
+            area.update(volume, state)
+
+    async def async_read_areas(self, version=None):
+        """Read every sub area in one pipelined burst and store them.
+
+        With a version, areas written by a command since are kept.
+        """
+        infos = await asyncio.gather(
+            *[
+                self._try_command(
+                    "Get area info failed.", self._player.get_sub_area_control, i
+                )
+                for i in range(self.supported_area_num)
+            ]
+        )
+        for info in infos:
+            self._store_area_info(info, version)
+        return self._area_state
+
+    async def async_set_areas(self, targets):
+        """Apply volume and power targets to several sub areas at once.
+
+        targets maps an area id ("1".."4") to a dict with optional "volume"
+        (0..15) and "state" keys. Each area needing a change gets a single
+        set_sub_area_control carrying both values; unchanged areas are
+        skipped. Returns the number of device writes.
+        """
+        writes = {}
+        for area_id, target in targets.items():
+            if area_id not in self._area_state or area_id == "0":
+                _LOGGER.error(f"{self._model} has no area {area_id}")
+                continue
+            current = self._area_state[area_id]
+            volume = int(target.get("volume", current.volume))
+            state = bool(target.get("state", current.state))
+            if (volume, state) != (current.volume, current.state):
+                writes[area_id] = (volume, state)
+
+        await asyncio.gather(
+            *[
+                self._try_command(
+                    "Set sub area failed.",
+                    self._player.set_sub_area_control,
+                    int(area_id) - 1,
+                    volume,
+                    state,
+                )
+                for area_id, (volume, state) in writes.items()
+            ]
+        )
+        for area_id, (volume, state) in writes.items():
+            self._area_state[area_id].update(volume, state)
+            self._stamp(f"{FIELD_AREA}{area_id}")
+        return len(writes)
 
     async def async_media_set_track(self, track_id):
         """Send previous track command."""
@@ -421,14 +894,48 @@ class FhwiseMusicPlayerDevice:
             "Set track failed.", self._player.set_current_list_play_file, track_id
         )
         self._cur_track = track_id
+        self._position_stale = True
+        self._stamp(FIELD_TRACK, FIELD_POSITION)
+
+    async def async_get_page(self, page):
+        """Return the (artist, title, length, path) of a page of the list."""
+        return await self._playlist.async_page(
+            self._async_browse_track_info, page, self.list_count
+        )
+
+    async def _async_browse_track_info(self, index):
+        """Fetch a list entry for the media browser.
+
+        A failed read only fails the browse, the device stays available.
+        """
+        self.calls += 1
+        start = time.monotonic()
+        try:
+            info = await self._player.get_current_list_file_info(index)
+        except Exception as err:
+            elapsed = (time.monotonic() - start) * 1000
+            self.metrics.record("get_current_list_file_info", elapsed, err)
+            raise BrowseError(f"Reading entry {index} of {self._host} failed") from err
+        elapsed = (time.monotonic() - start) * 1000
+        self.metrics.record("get_current_list_file_info", elapsed)
+        return info
 
     async def async_media_seek(self, position):
-        """Send seek command."""
+        """Send seek command, coalescing rapid seeks."""
+        self._cur_track_pos = position * 1000
+        self._media_position_updated_at = dt_util.utcnow()
+        self._stamp(FIELD_POSITION)
+        self._async_optimistic_update()
+        await self._coalescer.async_write(
+            FIELD_POSITION, position, self._async_write_seek
+        )
+
+    async def _async_write_seek(self, position):
+        """Send a seek position in seconds to the device."""
         await self._try_command(
             "Set seek failed.", self._player.set_current_file_position, position * 1000
         )
-        self._cur_track_pos = position * 1000
-        self._media_position_updated_at = dt_util.utcnow()
+        self._stamp(FIELD_POSITION)
 
     async def async_select_sound_mode(self, sound_mode):
         """Select sound mode."""
@@ -450,6 +957,7 @@ class FhwiseMusicPlayerDevice:
                 SOUND_MODE_LIST.index(sound_mode),
             )
         self._sound_mode = sound_mode
+        self._stamp(FIELD_SOUND_MODE)
 
     async def async_select_source(self, source):
         """Select input source."""
@@ -462,142 +970,496 @@ class FhwiseMusicPlayerDevice:
             self._player.set_volume_source,
             SOURCE_LIST.index(source),
         )
+        self._playlist.cancel()
         self._source = source
+        # The playlist follows the source
+        self._slow_stale = True
+        self._stamp(FIELD_SOURCE)
+
+    def _position_now(self):
+        """Return the extrapolated track position in ms."""
+        position = self._cur_track_pos
+        if self._player_state == STATE_PLAYING and self._media_position_updated_at:
+            elapsed = dt_util.utcnow() - self._media_position_updated_at
+            position += elapsed.total_seconds() * 1000
+        return int(position)
+
+    async def async_snapshot(self):
+        """Capture the device state for a later restore.
+
+        The caller refreshes the state first, through the coordinator.
+        """
+        if not self._available:
+            raise HomeAssistantError(f"Can not snapshot unavailable {self._host}")
+        self._snapshot = {
+            "source": self._source,
+            "track": self._cur_track,
+            "track_name": self._cur_track_name,
+            "position": self._position_now(),
+            "areas": {
+                area: state.as_dict() for area, state in self._area_state.items()
+            },
+            "sound_mode": self._sound_mode,
+            "play_mode": self._play_mode,
+            "play_state": self._player_state,
+        }
+        return self._snapshot
+
+    async def async_restore(self):
+        """Bring the device back to the last snapshot.
+
+        Only settings that differ from the current state are sent, in an
+        order where nothing undoes an earlier step: source, track, seek,
+        volume, EQ, play mode, then play/pause. Returns the names of the
+        restored settings. The caller refreshes the state first, through the
+        coordinator.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            raise HomeAssistantError(f"No snapshot of {self._host} to restore")
+        restored = []
+
+        if snapshot["source"] != self._source:
+            await self.async_select_source(snapshot["source"])
+            restored.append("source")
+
+        track_changed = False
+        if snapshot["source"] == SOURCE_LOCAL and (
+            snapshot["track_name"] != self._cur_track_name
+        ):
+            track = self._playlist.find(snapshot["track_name"], snapshot["track"])
+            if track is not None:
+                await self.async_media_set_track(track)
+                self._cur_track_name = snapshot["track_name"]
+                track_changed = True
+                restored.append("track")
+
+        if track_changed or (
+            abs(snapshot["position"] - self._position_now())
+            > POSITION_DRIFT_THRESHOLD
+        ):
+            await self._async_write_seek(snapshot["position"] / 1000)
+            self._cur_track_pos = snapshot["position"]
+            self._media_position_updated_at = dt_util.utcnow()
+            restored.append("position")
+
+        main = snapshot["areas"].get("0")
+        if main and main["volume"] != self._area_state["0"].volume:
+            await self._async_write_volume("0", main["volume"])
+            restored.append("volume")
+        areas = {
+            area: state for area, state in snapshot["areas"].items() if area != "0"
+        }
+        if areas and await self.async_set_areas(areas):
+            restored.append("areas")
+
+        if snapshot["sound_mode"] != self._sound_mode:
+            await self.async_select_sound_mode(snapshot["sound_mode"])
+            restored.append("sound_mode")
+
+        if snapshot["play_mode"] != self._play_mode:
+            await self.async_set_play_mode(snapshot["play_mode"])
+            restored.append("play_mode")
+
+        if snapshot["play_state"] != self._player_state:
+            await self.async_media_play_pause()
+            restored.append("play_state")
+
+        _LOGGER.debug(f"Restored {restored} of {self._host}")
+        return restored
 
     async def async_update(self, *args, **kwargs):
-        """Fetch state from the device."""
+        """Fetch the whole state from the device."""
+        await self.async_update_fast()
+        await self.async_update_slow()
+
+    async def async_update_fast(self):
+        """Fetch play status, position, volume and areas.
+
+        Independent reads are issued together so they are pipelined on the
+        transport instead of waiting one round trip each.
+        """
+        calls = self.calls
+        version = self._version
+        timed = self.metrics.async_timed
         try:
+            read_position = self._position_due()
+            self.fast_skipped = 0 if read_position else 1
+            area_reads = []
             if self.supported_area:
-                room_info = (
-                    await self._try_command(
-                        "Get current room info failed.",
-                        self._player.get_current_room_info,
+                area_reads.append(
+                    timed(
+                        "rooms",
+                        self._try_command(
+                            "Get current room info failed.",
+                            self._player.get_current_room_info,
+                        ),
                     )
-                ).split("::")
+                )
+                area_reads.append(timed("areas", self.async_read_areas(version)))
+
+            (
+                volume_level,
+                play_state,
+                cur_track_name,
+                cur_track_pos,
+                *area_results,
+            ) = await asyncio.gather(
+                timed(
+                    "volume",
+                    self._try_command(
+                        "Get volume level failed", self._player.get_volume_level
+                    ),
+                ),
+                timed(
+                    "status",
+                    self._try_command(
+                        "Get play status failed.", self._player.get_play_status
+                    ),
+                ),
+                timed(
+                    "track",
+                    self._try_command(
+                        "Get current list tracks name failed",
+                        self._player.get_current_file_name,
+                    ),
+                ),
+                self._async_get_position(read_position),
+                *area_reads,
+            )
+            prev_state = self._player_state
+            prev_track_name = self._cur_track_name
+
+            if self.supported_area:
+                room_info = area_results[0].split("::")
                 _LOGGER.debug(f"Got current room info: {room_info}")
                 self._cur_area_name = room_info[0]
                 self._cur_area_id = room_info[1]
 
-
-            volume_level = await self._try_command(
-                "Get volume level failed", self._player.get_volume_level
-            )
             _LOGGER.debug(f"Got new vol level: {volume_level}")
-            self._area_state["0"] = {"volume": int(volume_level), "state": True}
+            self._store_area("0", int(volume_level), True, version)
+            self._store_play_state(play_state, version)
+            self._store_muted(version)
+            self._store_track_name(cur_track_name, version)
+
+            if not read_position and (
+                prev_state != self._player_state
+                or prev_track_name != self._cur_track_name
+            ):
+                read_position = True
+                self.fast_skipped = 0
+                cur_track_pos = await self._async_get_position(read_position)
+            if read_position and self._fresh(FIELD_POSITION, version):
+                self._sync_position(cur_track_pos)
 
-            if self.supported_area:
-                for i in range(self.supported_area_num):
-                    area_info = (
-                        await self._try_command(
-                            "Get area info failed.",
-                            self._player.get_sub_area_control,
-                            i,
-                        )
-                    ).split("::")
-                    _LOGGER.debug(f"Got area info: {area_info}")
-                    self._area_state[f"{int(area_info[0])+1}"] = {
-                        "volume": int(area_info[1]),
-                        "state": area_info[2] != "0",
-                    }
-
-            play_state = await self._try_command(
-                "Get play status failed.", self._player.get_play_status
-            )
-            _LOGGER.debug(f"Got state: {play_state}")
-            if play_state == 1:
-                self._player_state = STATE_PLAYING
-            elif play_state == 2:
-                self._player_state = STATE_PAUSED
-
-            self._volume_muted = True
-            for (_, v) in self._area_state.items():
-                if v["state"] and v["volume"] > 0:
-                    self._volume_muted = False
-                    break
-
-            cur_eq_switch = await self._try_command(
-                "Get current EQ switch failed", self._player.get_eq_switch
-            )
-            _LOGGER.debug(f"Got current EQ switch: {cur_eq_switch}")
-            if cur_eq_switch:
-                cur_eq_mode = await self._try_command(
-                    "Get current EQ mode failed", self._player.get_eq_type
-                )
-                _LOGGER.debug(f"Got current EQ mode: {cur_eq_mode}")
-                self._sound_mode = SOUND_MODE_LIST[cur_eq_mode]
-            else:
-                self._sound_mode = SOUND_MODE_OFF
+            self._available = True
+            self._last_seen = time.monotonic()
 
-            cur_source_id = await self._try_command(
-                "Get current source failed", self._player.get_volume_source
+        except Exception as err:
+            self._available = False
+            _LOGGER.warning(f"Got exception while fetching device state: {err}")
+        finally:
+            self.tier_calls["fast"] = self.calls - calls
+
+    async def async_update_slow(self):
+        """Fetch EQ, source, play mode and the playlist."""
+        await self.async_update_settings()
+        if self._available:
+            await self.async_update_playlist()
+
+    async def async_update_settings(self):
+        """Fetch EQ, source, play mode and the playlist length."""
+        calls = self.calls
+        version = self._version
+        timed = self.metrics.async_timed
+        try:
+            (
+                sound_mode,
+                cur_source_id,
+                cur_play_mode,
+                cur_list_tracks_account,
+            ) = await asyncio.gather(
+                timed("eq", self._async_get_sound_mode()),
+                timed(
+                    "source",
+                    self._try_command(
+                        "Get current source failed", self._player.get_volume_source
+                    ),
+                ),
+                timed(
+                    "play_mode",
+                    self._try_command(
+                        "Get current play mode failed", self._player.get_play_mode
+                    ),
+                ),
+                timed(
+                    "playlist_count",
+                    self._try_command(
+                        "Get current list tracks account failed",
+                        self._player.get_current_list_file_account,
+                    ),
+                ),
             )
-            _LOGGER.debug(f"Got current source: {cur_source_id}")
-            self._source = SOURCE_LIST[cur_source_id]
 
-            cur_list_tracks_account = await self._try_command(
-                "Get current list tracks account failed",
-                self._player.get_current_list_file_account,
-            )
+            if self._fresh(FIELD_SOUND_MODE, version):
+                self._sound_mode = sound_mode
+            self._store_source(cur_source_id, version)
+            if self._fresh(FIELD_PLAY_MODE, version):
+                self._play_mode = PLAY_MODE_LIST[cur_play_mode]
+
             _LOGGER.debug(f"Got current list tracks account: {cur_list_tracks_account}")
+            self._list_count = cur_list_tracks_account
 
-            cur_track_name = await self._try_command(
-                "Get current list tracks name failed",
-                self._player.get_current_file_name,
-            )
-            _LOGGER.debug(f"Got current list tracks name: {cur_track_name}")
-
-            self.tracks = []
-            for i in range(cur_list_tracks_account):
-                """
-                    info:
-                    0::Eagles-加州旅馆::432067::<unknown>::/mnt/internal_sd/Music/华尔思内存/Eagles-加州旅馆.wav
-                """
-                info = await self._try_command(
-                    "Get list tracks account failed",
-                    self._player.get_current_list_file_info,
-                    i,
-                )
-                _LOGGER.debug(f"Got list [{i}] tracks info: {info}")
-                info_array = info.split("::")
-                _LOGGER.debug(f"Got info array: {info_array}")
-                self.tracks.append((info_array[3], info_array[1]))
-                if info_array[1] == cur_track_name:
-                    _LOGGER.debug(f"Got current track number: {i}")
-                    self._cur_track = i
-                    self._cur_track_len = int(info_array[2])
-
-            cur_track_pos = await self._try_command(
-                "Get current track position failed",
-                self._player.get_current_file_position,
+            self._slow_stale = False
+
+        except Exception as err:
+            self._available = False
+            _LOGGER.warning(f"Got exception while fetching device settings: {err}")
+        finally:
+            self.tier_calls["slow"] = self.calls - calls
+
+    async def async_update_playlist(self):
+        """Bring the playlist cache in line with the last read length."""
+        calls = self.calls
+        try:
+            await self.metrics.async_timed(
+                "playlist",
+                self._playlist.async_refresh(
+                    self._async_get_track_info,
+                    self._list_count,
+                    self._cur_track_name if self._source == SOURCE_LOCAL else None,
+                    self._async_playlist_updated,
+                ),
             )
-            _LOGGER.debug(f"Got current track position: {cur_track_pos}ms")
-            if self._cur_track_pos != cur_track_pos:
-                self._cur_track_pos = cur_track_pos
-                self._media_position_updated_at = dt_util.utcnow()
+            self._resolve_current_track()
 
-            cur_play_mode = await self._try_command(
+        except Exception as err:
+            self._available = False
+            _LOGGER.warning(f"Got exception while fetching the playlist: {err}")
+        finally:
+            self.tier_calls["slow"] += self.calls - calls
+
+    def _store_play_state(self, play_state, version):
+        """Store a play status reply, 1 playing and 2 paused."""
+        _LOGGER.debug(f"Got state: {play_state}")
+        if not self._fresh(FIELD_PLAY_STATE, version):
+            return
+        if play_state == 1:
+            self._player_state = STATE_PLAYING
+        elif play_state == 2:
+            self._player_state = STATE_PAUSED
+
+    def _store_muted(self, version):
+        """Derive mute from the areas: muted unless one is on and audible."""
+        if not self._fresh(FIELD_MUTED, version):
+            return
+        self._volume_muted = True
+        for (_, v) in self._area_state.items():
+            if v.state and v.volume > 0:
+                self._volume_muted = False
+                break
+
+    def _store_track_name(self, cur_track_name, version):
+        """Store the playing file name and find it in the playlist."""
+        _LOGGER.debug(f"Got current list tracks name: {cur_track_name}")
+        if not self._fresh(FIELD_TRACK, version):
+            return
+        if cur_track_name != self._cur_track_name:
+            self._cur_track_name = cur_track_name
+            self._resolve_current_track()
+
+    def _store_source(self, cur_source_id, version):
+        """Store the input source, dropping the playlist download on change."""
+        _LOGGER.debug(f"Got current source: {cur_source_id}")
+        if not self._fresh(FIELD_SOURCE, version):
+            return
+        if SOURCE_LIST[cur_source_id] != self._source:
+            self._playlist.cancel()
+        self._source = SOURCE_LIST[cur_source_id]
+
+    async def async_confirm(self):
+        """Read back the fields commands wrote since the last confirm.
+
+        Each field gets its own read instead of a full refresh. Returns
+        false when a read failed, leaving the fields to the next refresh.
+        """
+        fields, self._unconfirmed = self._unconfirmed, set()
+        if not fields:
+            return True
+        version = self._version
+        reads = [
+            self._async_confirm_field(field, version)
+            for field in fields
+            if field != FIELD_MUTED
+        ]
+        try:
+            await asyncio.gather(*reads)
+        except Exception as err:
+            _LOGGER.debug(f"Confirming {sorted(fields)} of {self._host} failed: {err}")
+            self._slow_stale = True
+            return False
+        if FIELD_MUTED in fields or any(f.startswith(FIELD_AREA) for f in fields):
+            self._store_muted(version)
+        _LOGGER.debug(f"Confirmed {sorted(fields)} of {self._host}")
+        return True
+
+    async def _async_confirm_field(self, field, version):
+        """Read a single field from the device and store it."""
+        if field == FIELD_PLAY_STATE:
+            self._store_play_state(
+                await self._try_command(
+                    "Get play status failed.", self._player.get_play_status
+                ),
+                version,
+            )
+        elif field == FIELD_TRACK:
+            self._store_track_name(
+                await self._try_command(
+                    "Get current list tracks name failed",
+                    self._player.get_current_file_name,
+                ),
+                version,
+            )
+        elif field == FIELD_POSITION:
+            position = await self._async_get_position(True)
+            if self._fresh(FIELD_POSITION, version):
+                self._sync_position(position)
+        elif field == FIELD_SOUND_MODE:
+            sound_mode = await self._async_get_sound_mode()
+            if self._fresh(FIELD_SOUND_MODE, version):
+                self._sound_mode = sound_mode
+        elif field == FIELD_SOURCE:
+            self._store_source(
+                await self._try_command(
+                    "Get current source failed", self._player.get_volume_source
+                ),
+                version,
+            )
+        elif field == FIELD_PLAY_MODE:
+            play_mode = await self._try_command(
                 "Get current play mode failed", self._player.get_play_mode
             )
-            self._play_mode = PLAY_MODE_LIST[cur_play_mode]
+            if self._fresh(FIELD_PLAY_MODE, version):
+                self._play_mode = PLAY_MODE_LIST[play_mode]
+        elif field == f"{FIELD_AREA}0":
+            volume_level = await self._try_command(
+                "Get volume level failed", self._player.get_volume_level
+            )
+            self._store_area("0", int(volume_level), True, version)
+        else:
+            area_id = field[len(FIELD_AREA):]
+            self._store_area_info(
+                await self._try_command(
+                    "Get area info failed.",
+                    self._player.get_sub_area_control,
+                    int(area_id) - 1,
+                ),
+                version,
+            )
 
-            self._available = True
+    async def _async_get_sound_mode(self):
+        """Read the EQ switch and, when it is on, the EQ type."""
+        cur_eq_switch = await self._try_command(
+            "Get current EQ switch failed", self._player.get_eq_switch
+        )
+        _LOGGER.debug(f"Got current EQ switch: {cur_eq_switch}")
+        if not cur_eq_switch:
+            return SOUND_MODE_OFF
+        cur_eq_mode = await self._try_command(
+            "Get current EQ mode failed", self._player.get_eq_type
+        )
+        _LOGGER.debug(f"Got current EQ mode: {cur_eq_mode}")
+        return SOUND_MODE_LIST[cur_eq_mode]
+
+    async def _async_get_track_info(self, index):
+        """Fetch the raw info of a playlist entry."""
+        info = await self._try_command(
+            "Get list tracks info failed",
+            self._player.get_current_list_file_info,
+            index,
+        )
+        _LOGGER.debug(f"Got list [{index}] tracks info: {info}")
+        return info
+
+    @callback
+    def _async_optimistic_update(self):
+        """Publish state changed ahead of a device write."""
+        if self._update_callback is not None:
+            self._update_callback()
+
+    @callback
+    def _async_playlist_updated(self):
+        """Publish a partially downloaded playlist."""
+        self._resolve_current_track()
+        if self._update_callback is not None:
+            self._update_callback()
+
+    def _position_due(self):
+        """Return true when the position has to be read this refresh."""
+        if not self._interpolate_position or self._position_stale:
+            return True
+        elapsed = time.monotonic() - self._last_position_sync
+        return elapsed >= POSITION_SYNC_INTERVAL
+
+    async def _async_get_position(self, read_position):
+        """Read the track position in ms, or None when not due."""
+        if not read_position:
+            return None
+        return await self.metrics.async_timed(
+            "position",
+            self._try_command(
+                "Get current track position failed",
+                self._player.get_current_file_position,
+            ),
+        )
 
-        except Exception as err:
-            self._available = False
-            _LOGGER.error(f"Got exception while fetching device state")
-            _LOGGER.error(err)
-            traceback.print_exc()
+    def _sync_position(self, position):
+        """Store a read position.
+
+        With interpolation the timestamp only moves when the position
+        drifted from what HA extrapolates, so playing does not rewrite the
+        state every refresh.
+        """
+        _LOGGER.debug(f"Got current track position: {position}ms")
+        now = dt_util.utcnow()
+        self._position_stale = False
+        self._last_position_sync = time.monotonic()
+        if not self._interpolate_position:
+            if self._cur_track_pos != position:
+                self._cur_track_pos = position
+                self._media_position_updated_at = now
+            return
+
+        expected = self._cur_track_pos
+        if self._player_state == STATE_PLAYING and self._media_position_updated_at:
+            elapsed = (now - self._media_position_updated_at).total_seconds()
+            expected += elapsed * 1000
+        if (
+            self._media_position_updated_at is None
+            or abs(position - expected) > POSITION_DRIFT_THRESHOLD
+        ):
+            self._cur_track_pos = position
+            self._media_position_updated_at = now
+
+    def _resolve_current_track(self):
+        """Find the playing track in the playlist by file name."""
+        track = self._playlist.find(self._cur_track_name, self._cur_track)
+        if track is None:
+            return
+        _LOGGER.debug(f"Got current track number: {track}")
+        self._cur_track = track
+        self._cur_track_len = self.tracks.length(track)
 
 
 class FhwiseMusicPlayer(MediaPlayerEntity):
     """A fhwise media player that only supports music."""
 
-    tracks = []
-
-    def __init__(self, player_dev, name, area=0):
+    def __init__(self, coordinator, name, area=0):
         """Initialize the demo device."""
-        self._player_dev = player_dev
+        self._coordinator = coordinator
+        self._player_dev = coordinator.device
         self._area = f"{area}"
+        self._last_rendered = None
         if area:
             self._name = f"{name} {area}"
             self._unique_id = f"{self._player_dev.unique_id}-{area}"
@@ -619,8 +1481,60 @@ class FhwiseMusicPlayer(MediaPlayerEntity):
 
     @property
     def should_poll(self):
-        """Push an update after each command."""
-        return True
+        """State is pushed by the coordinator."""
+        return False
+
+    async def async_added_to_hass(self):
+        """Subscribe to coordinator updates."""
+        self.async_on_remove(
+            self._coordinator.async_add_listener(self._area, self._async_state_changed)
+        )
+
+    def _rendered_state(self):
+        """Return the attributes worth a state write."""
+        return (
+            self.available,
+            self.state,
+            self.volume_level,
+            self.is_volume_muted,
+            self.shuffle,
+            self.repeat,
+            self.source,
+            self.sound_mode,
+            self.media_title,
+            self.media_artist,
+            self.media_duration,
+            self.media_track,
+            self._player_dev.position_bucket,
+            self._rendered_attributes(),
+        )
+
+    def _rendered_attributes(self):
+        """Return coarse buckets of the main entity's refresh attributes.
+
+        The statistics change on every refresh, so they only force a write
+        once per STATS_WRITE_INTERVAL.
+        """
+        if self._area != "0":
+            return None
+        loaded, total = self._player_dev.playlist_progress
+        return (
+            self._player_dev.model,
+            self._coordinator.effective_interval,
+            loaded * PLAYLIST_PROGRESS_STEPS // total if total else None,
+            int(time.monotonic() // STATS_WRITE_INTERVAL),
+        )
+
+    @callback
+    def _async_state_changed(self):
+        """Write the state unless nothing the entity renders changed."""
+        rendered = self._rendered_state()
+        if rendered == self._last_rendered:
+            self._coordinator.record_write(suppressed=True)
+            return
+        self._last_rendered = rendered
+        self._coordinator.record_write(suppressed=False)
+        self.async_write_ha_state()
 
     @property
     def unique_id(self):
@@ -638,21 +1552,31 @@ class FhwiseMusicPlayer(MediaPlayerEntity):
         return self._player_dev.available
 
     @property
-    def device_state_attributes(self):
+    def extra_state_attributes(self):
         """Return the state attributes of the device."""
+        if self._area == "0":
+            return {
+                **self._state_attrs,
+                ATTR_REFRESH_TIERS: self._coordinator.tier_stats,
+                ATTR_REFRESH_CYCLES: self._coordinator.cycle_stats,
+                ATTR_STATE_WRITES: self._coordinator.write_stats,
+                ATTR_PLAYLIST_PROGRESS: list(self._player_dev.playlist_progress),
+                ATTR_POLL_INTERVAL: self._coordinator.effective_interval.total_seconds(),
+                ATTR_REQUEST_LATENCY: self._player_dev.latency_stats,
+            }
         return self._state_attrs
 
     @property
     def state(self):
         """Return the state of the player."""
-        if not self._player_dev.area_state[self._area]["state"]:
+        if not self._player_dev.area_state[self._area].state:
             return STATE_OFF
         return self._player_dev.play_state
 
     @property
     def volume_level(self):
         """Return the volume level of the media player (0..1)."""
-        return self._player_dev.area_state[self._area]["volume"] * 0.0666
+        return self._player_dev.area_state[self._area].volume * 0.0666
 
     @property
     def is_volume_muted(self):
@@ -664,6 +1588,11 @@ class FhwiseMusicPlayer(MediaPlayerEntity):
         """Boolean if shuffling is enabled."""
         return self._player_dev.shuffle
 
+    @property
+    def repeat(self):
+        """Return current repeat mode."""
+        return self._player_dev.repeat
+
     @property
     def sound_mode(self):
         """Return the current sound mode."""
@@ -720,87 +1649,179 @@ class FhwiseMusicPlayer(MediaPlayerEntity):
             await self._player_dev.async_media_on_off(self._area)
         if self.state is not STATE_PLAYING:
             await self._player_dev.async_media_play_pause()
-        self.schedule_update_ha_state()
+        self._coordinator.async_command_sent()
 
     async def async_turn_off(self):
         """Turn the media player off."""
         if self.state is not STATE_OFF:
             await self._player_dev.async_media_on_off(self._area)
-        self.schedule_update_ha_state()
+        self._coordinator.async_command_sent()
 
     async def async_mute_volume(self, mute):
         """Mute the volume."""
         await self._player_dev.async_set_volume_level(0, self._area)
-        self.schedule_update_ha_state()
+        self._coordinator.async_command_sent()
 
     async def async_volume_up(self):
         """Increase volume."""
-        volume = self._player_dev.area_state[self._area]["volume"]
+        volume = self._player_dev.area_state[self._area].volume
         volume = min(15, volume + 1)
         await self._player_dev.async_set_volume_level(volume, self._area)
-        self.schedule_update_ha_state()
+        self._coordinator.async_command_sent()
 
     async def async_volume_down(self):
         """Decrease volume."""
-        volume = self._player_dev.area_state[self._area]["volume"]
+        volume = self._player_dev.area_state[self._area].volume
         volume = max(0, volume - 1)
         await self._player_dev.async_set_volume_level(volume, self._area)
-        self.schedule_update_ha_state()
+        self._coordinator.async_command_sent()
 
     async def async_set_volume_level(self, volume):
         """Set the volume level, range 0..1."""
         volume_level = int(volume / 0.0666)
         await self._player_dev.async_set_volume_level(volume_level, self._area)
-        self.schedule_update_ha_state()
+        self._coordinator.async_command_sent()
 
     async def async_media_play(self):
         """Send play command."""
         await self.async_turn_on()
         if self.state is not STATE_PLAYING:
             await self._player_dev.async_media_play_pause()
-        self.schedule_update_ha_state()
+        self._coordinator.async_command_sent()
 
     async def async_media_pause(self):
         """Send pause command."""
         await self.async_turn_on()
         if self.state is STATE_PLAYING:
             await self._player_dev.async_media_play_pause()
-        self.schedule_update_ha_state()
+        self._coordinator.async_command_sent()
 
     async def async_media_previous_track(self):
         """Send previous track command."""
         track = self._player_dev.current_track
         if track > 0:
             await self._player_dev.async_media_set_track(track - 1)
-        self.schedule_update_ha_state()
+        self._coordinator.async_command_sent()
 
     async def async_media_next_track(self):
         """Send next track command."""
         track = self._player_dev.current_track
         if track < len(self._player_dev.tracks) - 1:
             await self._player_dev.async_media_set_track(track + 1)
-        self.schedule_update_ha_state()
+        self._coordinator.async_command_sent()
 
     async def async_media_seek(self, position):
         """Send seek command."""
         await self._player_dev.async_media_seek(position)
-        self.schedule_update_ha_state()
+        self._coordinator.async_command_sent()
+
+    async def async_play_media(self, media_type, media_id, **kwargs):
+        """Play a track picked in the media browser."""
+        if not media_id.startswith(BROWSE_TRACK):
+            raise HomeAssistantError(f"Can not play {media_type} {media_id}")
+        await self._player_dev.async_media_set_track(int(media_id[len(BROWSE_TRACK):]))
+        self._coordinator.async_command_sent()
+
+    async def async_browse_media(self, media_content_type=None, media_content_id=None):
+        """Browse the device list a page at a time."""
+        if media_content_id in (None, BROWSE_ROOT):
+            return self._browse_root()
+        if media_content_id.startswith(BROWSE_PAGE):
+            return await self._async_browse_page(
+                int(media_content_id[len(BROWSE_PAGE):])
+            )
+        raise BrowseError(f"Media not found: {media_content_type} / {media_content_id}")
+
+    def _browse_root(self):
+        """Return the pages of the device list."""
+        count = self._player_dev.list_count
+        size = self._player_dev.page_size
+        return BrowseMedia(
+            title=self._name,
+            media_class=MEDIA_CLASS_DIRECTORY,
+            media_content_id=BROWSE_ROOT,
+            media_content_type=MEDIA_TYPE_PLAYLIST,
+            can_play=False,
+            can_expand=True,
+            children=[
+                BrowseMedia(
+                    title=f"{start + 1}-{min(count, start + size)}",
+                    media_class=MEDIA_CLASS_DIRECTORY,
+                    media_content_id=f"{BROWSE_PAGE}{page}",
+                    media_content_type=MEDIA_TYPE_PLAYLIST,
+                    can_play=False,
+                    can_expand=True,
+                )
+                for page, start in enumerate(range(0, count, size))
+            ],
+        )
+
+    async def _async_browse_page(self, page):
+        """Return the tracks of a page, fetching only that page."""
+        start = page * self._player_dev.page_size
+        if not 0 <= start < self._player_dev.list_count:
+            raise BrowseError(f"Page {page} not found")
+        tracks = await self._player_dev.async_get_page(page)
+        return BrowseMedia(
+            title=f"{start + 1}-{start + len(tracks)}",
+            media_class=MEDIA_CLASS_DIRECTORY,
+            media_content_id=f"{BROWSE_PAGE}{page}",
+            media_content_type=MEDIA_TYPE_PLAYLIST,
+            can_play=False,
+            can_expand=True,
+            children=[
+                BrowseMedia(
+                    title=title,
+                    media_class=MEDIA_CLASS_TRACK,
+                    media_content_id=f"{BROWSE_TRACK}{index}",
+                    media_content_type=MEDIA_TYPE_MUSIC,
+                    can_play=True,
+                    can_expand=False,
+                )
+                for index, (_, title, _, _) in enumerate(tracks, start)
+            ],
+        )
 
     async def async_select_sound_mode(self, sound_mode):
         """Select sound mode."""
         await self._player_dev.async_select_sound_mode(sound_mode)
-        self.schedule_update_ha_state()
+        self._coordinator.async_command_sent()
 
     async def async_select_source(self, source):
         """Select input source."""
         await self._player_dev.async_select_source(source)
-        self.schedule_update_ha_state()
+        self._coordinator.async_command_sent()
 
     async def async_set_shuffle(self, shuffle):
         """Enable/disable shuffle mode."""
         await self._player_dev.async_set_shuffle(shuffle)
-        self.schedule_update_ha_state()
-
-    async def async_update(self):
-        """Docstring."""
-        return
+        self._coordinator.async_command_sent()
+
+    async def async_set_repeat(self, repeat):
+        """Set repeat mode."""
+        await self._player_dev.async_set_repeat(repeat)
+        self._coordinator.async_command_sent()
+
+    async def async_snapshot(self):
+        """Save the full player state."""
+        await self._coordinator.async_refresh_now()
+        await self._player_dev.async_snapshot()
+
+    async def async_restore(self):
+        """Restore the saved player state."""
+        await self._coordinator.async_refresh_now()
+        await self._player_dev.async_restore()
+        self._coordinator.async_command_sent()
+
+    async def async_set_areas(self, areas):
+        """Set volume and power of several areas in one batch."""
+        targets = {}
+        for area in areas:
+            target = {}
+            if ATTR_MEDIA_VOLUME_LEVEL in area:
+                target["volume"] = int(area[ATTR_MEDIA_VOLUME_LEVEL] / 0.0666)
+            if ATTR_POWER in area:
+                target["state"] = area[ATTR_POWER]
+            targets[f"{area[ATTR_AREA]}"] = target
+        await self._player_dev.async_set_areas(targets)
+        self._coordinator.async_command_sent()
@@ -0,0 +1,174 @@
+"""Latency and error metrics of device commands and refresh phases."""
+import asyncio
+from bisect import bisect_left
+import time
+
+import homeassistant.util.dt as dt_util
+
+# Upper bounds in ms of the latency histogram buckets, the last one is open
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# Refresh phases, fast tier first
+PHASES = (
+    "rooms",
+    "areas",
+    "volume",
+    "status",
+    "track",
+    "position",
+    "eq",
+    "source",
+    "play_mode",
+    "playlist_count",
+    "playlist",
+)
+
+
+class FhwiseHistogram:
+    """Fixed bucket latency histogram in ms."""
+
+    def __init__(self):
+        """Initialize an empty histogram."""
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = None
+
+    def add(self, elapsed):
+        """Add a sample in ms."""
+        self.buckets[bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        self.last = elapsed
+
+    def percentile(self, fraction):
+        """Return the upper bound of the bucket holding the percentile."""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def as_dict(self):
+        """Return the histogram for diagnostics."""
+        labels = [f"<={bound}" for bound in LATENCY_BUCKETS]
+        labels.append(f">{LATENCY_BUCKETS[-1]}")
+        return {
+            "count": self.count,
+            "total_ms": round(self.total, 1),
+            "mean_ms": round(self.total / self.count, 1) if self.count else None,
+            "max_ms": round(self.max, 1),
+            "last_ms": None if self.last is None else round(self.last, 1),
+            "p50_ms": self.percentile(0.5),
+            "p99_ms": self.percentile(0.99),
+            "buckets": dict(zip(labels, self.buckets)),
+        }
+
+
+class FhwiseCommandStats:
+    """Latency, failures and last success of one command."""
+
+    def __init__(self):
+        """Initialize empty stats."""
+        self.latency = FhwiseHistogram()
+        self.errors = 0
+        self.timeouts = 0
+        self.last_success = None
+
+    def as_dict(self):
+        """Return the stats for diagnostics."""
+        return {
+            **self.latency.as_dict(),
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "last_success": self.last_success,
+        }
+
+
+class FhwiseMetrics:
+    """Per command and per refresh phase metrics of a device.
+
+    Commands are keyed by the transport method name, phases by the part of
+    the state they read (volume, areas, playlist...). Phases of one tier
+    run concurrently, so their durations overlap.
+    """
+
+    def __init__(self):
+        """Initialize empty metrics, starting the setup clock."""
+        self.commands = {}
+        self.phases = {}
+        self.setup = {}
+        self._created = time.monotonic()
+
+    def record_setup(self, step):
+        """Record the seconds setup took to reach step, and return them."""
+        self.setup[step] = round(time.monotonic() - self._created, 3)
+        return self.setup[step]
+
+    def record(self, command, elapsed, err=None):
+        """Record a command that took elapsed ms and failed with err."""
+        stats = self.commands.get(command)
+        if stats is None:
+            stats = self.commands[command] = FhwiseCommandStats()
+        stats.latency.add(elapsed)
+        if err is None:
+            stats.last_success = dt_util.utcnow()
+        elif isinstance(err, asyncio.TimeoutError):
+            stats.timeouts += 1
+        else:
+            stats.errors += 1
+
+    async def async_timed(self, phase, awaitable):
+        """Await awaitable and record its duration as phase."""
+        start = time.monotonic()
+        try:
+            return await awaitable
+        finally:
+            histogram = self.phases.get(phase)
+            if histogram is None:
+                histogram = self.phases[phase] = FhwiseHistogram()
+            histogram.add((time.monotonic() - start) * 1000)
+
+    @property
+    def errors(self):
+        """Return the number of failed commands."""
+        return sum(stats.errors for stats in self.commands.values())
+
+    @property
+    def timeouts(self):
+        """Return the number of timed out commands."""
+        return sum(stats.timeouts for stats in self.commands.values())
+
+    @property
+    def dominant_command(self):
+        """Return the command that spent the most time on the device."""
+        if not self.commands:
+            return None
+        return max(self.commands, key=lambda name: self.commands[name].latency.total)
+
+    def as_dict(self):
+        """Return the metrics for diagnostics, slowest first."""
+        return {
+            "dominant_command": self.dominant_command,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "setup": dict(self.setup),
+            "commands": {
+                name: stats.as_dict()
+                for name, stats in sorted(
+                    self.commands.items(),
+                    key=lambda item: item[1].latency.total,
+                    reverse=True,
+                )
+            },
+            "phases": {
+                phase: histogram.as_dict()
+                for phase, histogram in self.phases.items()
+            },
+        }
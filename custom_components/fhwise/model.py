@@ -0,0 +1,160 @@
+"""Compact records of the device state."""
+from array import array
+import sys
+
+# Fields of FhwiseMusicPlayerDevice.state_slice, in order
+SLICE_FIELDS = (
+    "available",
+    "state",
+    "volume",
+    "power",
+    "muted",
+    "play_mode",
+    "sound_mode",
+    "source",
+    "track",
+    "title",
+    "artist",
+    "duration",
+    "position",
+    "position_updated_at",
+)
+
+
+def changed_fields(old, new):
+    """Return the names of the slice fields that differ."""
+    if old == new:
+        return ()
+    return tuple(
+        field for field, before, after in zip(SLICE_FIELDS, old, new) if before != after
+    )
+
+
+class FhwiseArea:
+    """Volume (0..15) and power of an area, updated in place."""
+
+    __slots__ = ("volume", "state")
+
+    def __init__(self, volume=0, state=False):
+        """Initialize the area."""
+        self.volume = volume
+        self.state = state
+
+    def update(self, volume, state):
+        """Set volume and power, return true when either changed."""
+        if volume == self.volume and state == self.state:
+            return False
+        self.volume = volume
+        self.state = state
+        return True
+
+    def as_dict(self):
+        """Return the area as a dict for storage and services."""
+        return {"volume": self.volume, "state": self.state}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build an area from as_dict output."""
+        return cls(data["volume"], data["state"])
+
+
+class FhwiseTrackTable:
+    """Column store of (artist, title, length, path) tracks.
+
+    Lengths live in an array and every other field in a list of strings.
+    Artists and folders repeat across a library, so they are interned and
+    shared, and a path is kept as its interned folder plus the file name.
+    Indexing returns the same tuples a list of tracks would.
+    """
+
+    __slots__ = ("_artists", "_titles", "_lengths", "_folders", "_files")
+
+    def __init__(self, tracks=()):
+        """Initialize the table with tracks."""
+        self._artists = []
+        self._titles = []
+        self._lengths = array("l")
+        self._folders = []
+        self._files = []
+        self.extend(tracks)
+
+    def __len__(self):
+        """Return the number of tracks."""
+        return len(self._titles)
+
+    def __iter__(self):
+        """Iterate over the tracks."""
+        return (self._track(i) for i in range(len(self)))
+
+    def __getitem__(self, index):
+        """Return a track, or a list of tracks for a slice."""
+        if isinstance(index, slice):
+            return [self._track(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        return self._track(index)
+
+    def __setitem__(self, index, track):
+        """Replace a track in place."""
+        artist, title, length, path = track
+        folder, file_name = split_path(path)
+        self._artists[index] = sys.intern(artist)
+        self._titles[index] = title
+        self._lengths[index] = length
+        self._folders[index] = folder
+        self._files[index] = file_name
+
+    def _track(self, index):
+        """Build the tuple of a track."""
+        return (
+            self._artists[index],
+            self._titles[index],
+            self._lengths[index],
+            self._folders[index] + self._files[index],
+        )
+
+    def artist(self, index):
+        """Return the artist of a track."""
+        return self._artists[index]
+
+    def title(self, index):
+        """Return the title of a track."""
+        return self._titles[index]
+
+    def length(self, index):
+        """Return the length of a track in ms."""
+        return self._lengths[index]
+
+    def file_name(self, index):
+        """Return the file name of a track."""
+        return self._files[index]
+
+    def folder(self, index):
+        """Return the folder of a track, with a trailing slash."""
+        return self._folders[index]
+
+    def extend(self, tracks):
+        """Append tracks."""
+        for artist, title, length, path in tracks:
+            folder, file_name = split_path(path)
+            self._artists.append(sys.intern(artist))
+            self._titles.append(title)
+            self._lengths.append(length)
+            self._folders.append(folder)
+            self._files.append(file_name)
+
+    def splice(self, start, stop, tracks):
+        """Replace tracks start..stop-1 with tracks, in place."""
+        replacement = FhwiseTrackTable(tracks)
+        for name in self.__slots__:
+            getattr(self, name)[start:stop] = getattr(replacement, name)
+
+    def truncate(self, count):
+        """Drop every track from count on."""
+        self.splice(count, len(self), ())
+
+
+def split_path(path):
+    """Split a path into its interned folder and file name."""
+    cut = path.rfind("/") + 1
+    return sys.intern(path[:cut]), path[cut:]
@@ -0,0 +1,326 @@
+"""Incremental cache of the device playlist."""
+import asyncio
+from bisect import insort
+from collections import OrderedDict
+import logging
+import posixpath
+
+from .model import FhwiseTrackTable, split_path
+from .scheduler import PRIORITY_BACKGROUND, request_priority
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 32
+DEFAULT_CONCURRENCY = 4
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_CACHED_PAGES = 10
+# Tries per entry of a download, a lost UDP reply only costs a retry
+FETCH_ATTEMPTS = 2
+EMPTY_TRACK = ("", "", 0, "")
+
+
+def parse_track(info):
+    """Parse a list entry into (artist, title, length, path).
+
+    info:
+        0::Eagles-加州旅馆::432067::<unknown>::/mnt/internal_sd/Music/华尔思内存/Eagles-加州旅馆.wav
+    The leading index is dropped so shifted entries still compare equal.
+    """
+    info_array = info.split("::")
+    path = info_array[4] if len(info_array) > 4 else ""
+    return (info_array[3], info_array[1], int(info_array[2]), path)
+
+
+class FhwisePlaylist:
+    """Cache of the current list, refetched only where it changed.
+
+    A refresh first compares a cheap fingerprint: the track count, whether
+    the playing file is known, and the first, middle and last entries. When
+    it differs, the first and last changed positions are located by binary
+    search on single entries, and only the entries between them are
+    fetched. This assumes the list changed in one contiguous block, which
+    holds for files added to or removed from a sorted folder; anything else
+    is caught by the next fingerprint and refetched.
+
+    The changed entries are downloaded by a background task, window after
+    window with bounded concurrency. Entries not loaded yet are EMPTY_TRACK
+    and on_update is called after every window. A download is cancelled
+    when the list changes under it, keeping only the loaded prefix.
+
+    Browsing reads the list a page at a time. A page is served from the
+    cache when all its entries are loaded, otherwise only that page is
+    fetched and kept in a small LRU cache of pages.
+    """
+
+    def __init__(
+        self,
+        window=DEFAULT_WINDOW,
+        concurrency=DEFAULT_CONCURRENCY,
+        page_size=DEFAULT_PAGE_SIZE,
+        cached_pages=DEFAULT_CACHED_PAGES,
+    ):
+        """Initialize an empty playlist."""
+        self.tracks = FhwiseTrackTable()
+        self.fetched = 0
+        self.page_size = page_size
+        self._window = window
+        self._concurrency = concurrency
+        self._cached_pages = cached_pages
+        self._pages = OrderedDict()
+        self._task = None
+        self._target = None
+        self._loaded_end = 0
+        self._index = None
+
+    @property
+    def loading(self):
+        """Return true while a download is running."""
+        return self._task is not None and not self._task.done()
+
+    @property
+    def progress(self):
+        """Return (loaded, total) of the current download."""
+        if not self.loading:
+            return (len(self.tracks), len(self.tracks))
+        start, end = self._target
+        return (self._loaded_end - start, end - start)
+
+    def cancel(self):
+        """Stop the running download, keeping the loaded prefix."""
+        if not self.loading:
+            return
+        self._task.cancel()
+        self._task = None
+        self._truncate(self._loaded_end)
+        _LOGGER.debug(f"Playlist download cancelled at {self._loaded_end}")
+
+    def as_list(self):
+        """Return the loaded tracks for storage."""
+        if self.loading:
+            return self.tracks[: self._loaded_end]
+        return list(self.tracks)
+
+    def restore(self, tracks):
+        """Serve tracks from storage until the next refresh."""
+        self._set_tracks(FhwiseTrackTable(tracks))
+
+    def __len__(self):
+        """Return the number of tracks."""
+        return len(self.tracks)
+
+    def _set_tracks(self, tracks):
+        """Replace the tracks and drop the name index."""
+        self.tracks = tracks
+        self._index = None
+
+    def _truncate(self, count):
+        """Drop the tracks from count on and the name index."""
+        self.tracks.truncate(count)
+        self._index = None
+
+    def _build_index(self):
+        """Map titles, file names and their stems to positions.
+
+        Keys are the strings held by the track table, and a key matching a
+        single track maps to its position rather than a list.
+        """
+        self._index = {}
+        self._index_range(0, len(self.tracks))
+        return self._index
+
+    def _index_range(self, start, end):
+        """Add the tracks start..end-1 to the name index.
+
+        Positions of a key stay sorted, so the first is the lowest.
+        """
+        index = self._index
+        tracks = self.tracks
+        for position in range(start, end):
+            title = tracks.title(position)
+            file_name = tracks.file_name(position)
+            stem = posixpath.splitext(file_name)[0]
+            for key in {title, file_name, title if stem == title else stem}:
+                if not key:
+                    continue
+                current = index.get(key)
+                if current is None:
+                    index[key] = position
+                elif isinstance(current, int):
+                    index[key] = sorted((current, position))
+                else:
+                    insort(current, position)
+
+    def positions(self, name):
+        """Return every position matching a title, path or file name."""
+        index = self._index if self._index is not None else self._build_index()
+        if name and "/" in name:
+            folder, file_name = split_path(name)
+            return [
+                position
+                for position in self.positions(file_name)
+                if self.tracks.folder(position) == folder
+            ]
+        found = index.get(name)
+        if found is None:
+            return []
+        return [found] if isinstance(found, int) else found
+
+    def find(self, name, hint=None):
+        """Return the position of name, or None.
+
+        A full path is unique. For duplicate titles the hint (the last
+        known position) or the entry right after it wins, as that is where
+        sequential play moves to.
+        """
+        positions = self.positions(name)
+        if not positions:
+            return None
+        if len(positions) > 1 and hint is not None:
+            for candidate in (hint, hint + 1):
+                if candidate in positions:
+                    return candidate
+        return positions[0]
+
+    async def async_page(self, fetch, page, count):
+        """Return the entries of a page of a count entries list."""
+        start = page * self.page_size
+        end = min(count, start + self.page_size)
+        if count == len(self.tracks):
+            entries = self.tracks[start:end]
+            if EMPTY_TRACK not in entries:
+                return entries
+
+        key = (count, page)
+        entries = self._pages.get(key)
+        if entries is not None:
+            self._pages.move_to_end(key)
+            return entries
+
+        semaphore = asyncio.Semaphore(self._concurrency)
+
+        async def _async_get_one(index):
+            async with semaphore:
+                return await self._async_get(fetch, index)
+
+        # Wait for every read so none is left failing unobserved
+        entries = await asyncio.gather(
+            *[_async_get_one(i) for i in range(start, end)], return_exceptions=True
+        )
+        for entry in entries:
+            if isinstance(entry, Exception):
+                raise entry
+        self._pages[key] = entries
+        while len(self._pages) > self._cached_pages:
+            self._pages.popitem(last=False)
+        return entries
+
+    def _known(self, name):
+        """Return true when name is a cached title."""
+        return bool(self.positions(name))
+
+    async def _async_get(self, fetch, index):
+        """Fetch and parse a single entry."""
+        self.fetched += 1
+        return parse_track(await fetch(index))
+
+    async def _async_load(self, fetch, start, end, on_update):
+        """Download entries start..end-1 window by window."""
+        request_priority.set(PRIORITY_BACKGROUND)
+        semaphore = asyncio.Semaphore(self._concurrency)
+
+        async def _async_get_one(index):
+            async with semaphore:
+                for attempt in range(1, FETCH_ATTEMPTS + 1):
+                    try:
+                        self.tracks[index] = await self._async_get(fetch, index)
+                        return
+                    except Exception as err:
+                        if attempt == FETCH_ATTEMPTS:
+                            raise
+                        _LOGGER.debug(f"Retrying playlist entry {index}: {err}")
+
+        try:
+            for window_start in range(start, end, self._window):
+                window_end = min(end, window_start + self._window)
+                await asyncio.gather(
+                    *[_async_get_one(i) for i in range(window_start, window_end)]
+                )
+                self._loaded_end = window_end
+                # Placeholders are not indexed, so the window only adds keys
+                if self._index is not None:
+                    self._index_range(window_start, window_end)
+                if on_update is not None:
+                    on_update()
+        except asyncio.CancelledError:
+            raise
+        except Exception as err:
+            _LOGGER.debug(f"Playlist download stopped at {self._loaded_end}: {err}")
+            self._truncate(self._loaded_end)
+            if on_update is not None:
+                on_update()
+
+    async def _async_unchanged(self, fetch, count, current_name):
+        """Compare the cheap fingerprint with the cache."""
+        if count != len(self.tracks):
+            return False
+        if count == 0:
+            return True
+        if current_name and not self._known(current_name):
+            return False
+        probes = sorted({0, count // 2, count - 1})
+        entries = await asyncio.gather(*[self._async_get(fetch, i) for i in probes])
+        return all(self.tracks[i] == entry for i, entry in zip(probes, entries))
+
+    async def _async_first_change(self, fetch, count, same):
+        """Binary search the first index whose entry changed."""
+        low, high = 0, same
+        while low < high:
+            mid = (low + high) // 2
+            if await self._async_get(fetch, mid) == self.tracks[mid]:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    async def _async_common_suffix(self, fetch, count, limit):
+        """Binary search how many trailing entries are unchanged."""
+        old_count = len(self.tracks)
+        low, high = 0, limit
+        while low < high:
+            mid = (low + high + 1) // 2
+            entry = await self._async_get(fetch, count - mid)
+            if entry == self.tracks[old_count - mid]:
+                low = mid
+            else:
+                high = mid - 1
+        return low
+
+    async def async_refresh(self, fetch, count, current_name=None, on_update=None):
+        """Bring the cache in line with a list of count entries.
+
+        fetch is a coroutine function returning the raw info of an index.
+        Returns true when a download of changed entries was started.
+        """
+        if self.loading:
+            if count == len(self.tracks):
+                return False
+            self.cancel()
+
+        if await self._async_unchanged(fetch, count, current_name):
+            return False
+
+        old_count = len(self.tracks)
+        same = min(count, old_count)
+        start = await self._async_first_change(fetch, count, same)
+        suffix = await self._async_common_suffix(fetch, count, same - start)
+        end = count - suffix
+        _LOGGER.debug(f"Playlist changed at {start}..{end} of {count}")
+        self._pages.clear()
+        self.tracks.splice(start, old_count - suffix, [EMPTY_TRACK] * (end - start))
+        self._index = None
+        self._target = (start, end)
+        self._loaded_end = start
+        self._task = asyncio.create_task(
+            self._async_load(fetch, start, end, on_update)
+        )
+        return True
@@ -0,0 +1,191 @@
+"""Priority scheduling and rate limiting of device requests."""
+import asyncio
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+import heapq
+import itertools
+import time
+
+PRIORITY_COMMAND = 0
+PRIORITY_POLL = 1
+PRIORITY_BACKGROUND = 2
+PRIORITY_NAMES = {
+    PRIORITY_COMMAND: "command",
+    PRIORITY_POLL: "poll",
+    PRIORITY_BACKGROUND: "background",
+}
+
+DEFAULT_COALESCE_DELAY = 0.3
+DEFAULT_SLOTS = 4
+DEFAULT_RATE = 50
+DEFAULT_BURST = 20
+LATENCY_SAMPLES = 256
+
+# Requests default to command priority; refreshes and background work
+# lower it for everything they run.
+request_priority = ContextVar("fhwise_request_priority", default=PRIORITY_COMMAND)
+
+
+def _percentile(ordered, fraction):
+    """Return the fraction percentile of a sorted list."""
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class FhwiseCommandScheduler:
+    """Hand out request slots by priority under a token bucket.
+
+    A refresh takes a slot per read, so a user command waiting for a slot
+    gets the next free one ahead of every queued poll read. The token
+    bucket caps requests per second across all priorities, and its tokens
+    go to waiters in the same priority order as the slots.
+    """
+
+    def __init__(self, slots=DEFAULT_SLOTS, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        """Initialize the scheduler."""
+        self._free = slots
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._rate = rate
+        self._burst = burst
+        self._tokens = burst
+        self._refilled = time.monotonic()
+        self._refill_timer = None
+        self._latency = {
+            priority: deque(maxlen=LATENCY_SAMPLES) for priority in PRIORITY_NAMES
+        }
+
+    def _refill(self):
+        """Add the tokens earned since the last refill."""
+        now = time.monotonic()
+        self._tokens = min(
+            self._burst, self._tokens + (now - self._refilled) * self._rate
+        )
+        self._refilled = now
+
+    def _dispatch(self):
+        """Grant a slot and a token to waiters, most urgent first.
+
+        Slot and token are handed out together so a queued command takes
+        the next token ahead of every background request.
+        """
+        self._refill_timer = None
+        while self._waiters and self._free:
+            self._refill()
+            if self._tokens < 1:
+                self._refill_timer = asyncio.get_running_loop().call_later(
+                    (1 - self._tokens) / self._rate, self._dispatch
+                )
+                return
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self._tokens -= 1
+            self._free -= 1
+            future.set_result(None)
+
+    async def _async_acquire(self, priority):
+        """Wait for a free slot and a token."""
+        if self._free and not self._waiters:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self._free -= 1
+                return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        if self._refill_timer is None:
+            self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()
+            else:
+                future.cancel()
+            raise
+
+    def _release(self):
+        """Return a slot and pass it on to the most urgent waiter."""
+        self._free += 1
+        if self._refill_timer is None:
+            self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority=None):
+        """Hold a request slot for the duration of a request."""
+        if priority is None:
+            priority = request_priority.get()
+        start = time.monotonic()
+        await self._async_acquire(priority)
+        try:
+            yield
+        finally:
+            self._release()
+            self._latency[priority].append((time.monotonic() - start) * 1000)
+
+    @property
+    def latency_stats(self):
+        """Return p50/p99 request latency in ms by priority."""
+        stats = {}
+        for priority, samples in self._latency.items():
+            if not samples:
+                continue
+            ordered = sorted(samples)
+            stats[PRIORITY_NAMES[priority]] = {
+                "count": len(ordered),
+                "p50": round(_percentile(ordered, 0.5), 1),
+                "p99": round(_percentile(ordered, 0.99), 1),
+            }
+        return stats
+
+
+class FhwiseWriteCoalescer:
+    """Collapse rapid writes of the same setting into one.
+
+    The first write of a key waits delay seconds; writes arriving meanwhile
+    only replace the target value. Every caller waits for the single write
+    that is finally sent.
+    """
+
+    def __init__(self, delay=DEFAULT_COALESCE_DELAY):
+        """Initialize the coalescer."""
+        self._delay = delay
+        self._pending = {}
+        self._sending = Counter()
+        self._tasks = set()
+        self.dropped = 0
+
+    def pending(self, key):
+        """Return true from the first write of key until it was sent."""
+        return key in self._pending or key in self._sending
+
+    async def _async_flush(self, key):
+        """Send the latest value of key."""
+        await asyncio.sleep(self._delay)
+        value, write, future = self._pending.pop(key)
+        self._sending[key] += 1
+        try:
+            future.set_result(await write(value))
+        except Exception as err:
+            future.set_exception(err)
+        finally:
+            self._sending[key] -= 1
+            if not self._sending[key]:
+                del self._sending[key]
+
+    async def async_write(self, key, value, write):
+        """Write value with the coroutine function write, coalesced by key."""
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.dropped += 1
+            pending[0] = value
+            pending[1] = write
+            future = pending[2]
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[key] = [value, write, future]
+            task = asyncio.create_task(self._async_flush(key))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return await asyncio.shield(future)
@@ -0,0 +1,141 @@
+"""Diagnostic sensors of fhwise command and refresh metrics."""
+from datetime import timedelta
+
+from homeassistant.components.sensor import SensorEntity
+from homeassistant.const import CONF_HOST, CONF_NAME
+from homeassistant.helpers.entity import EntityCategory
+
+from .const import DOMAIN, FHWISE_METRICS, FHWISE_MODEL
+from .metrics import PHASES
+
+# Metrics live in memory, polling them costs no device request
+SCAN_INTERVAL = timedelta(seconds=30)
+
+UNIT_MS = "ms"
+
+
+async def async_setup_entry(hass, config_entry, async_add_entities):
+    """Set up the metric sensors of a fhwise device, disabled by default."""
+    entry_data = hass.data[DOMAIN][config_entry.entry_id]
+    metrics = entry_data[FHWISE_METRICS]
+    name = config_entry.data[CONF_NAME]
+    unique_id = f"{entry_data[FHWISE_MODEL]}-{config_entry.data[CONF_HOST]}"
+
+    sensors = [
+        FhwiseErrorsSensor(metrics, name, unique_id),
+        FhwiseTimeoutsSensor(metrics, name, unique_id),
+        FhwiseDominantCommandSensor(metrics, name, unique_id),
+    ]
+    sensors.extend(
+        FhwisePhaseSensor(metrics, name, unique_id, phase) for phase in PHASES
+    )
+    async_add_entities(sensors)
+
+
+class FhwiseMetricSensor(SensorEntity):
+    """Base of the fhwise metric sensors."""
+
+    key = None
+    label = None
+
+    def __init__(self, metrics, name, unique_id):
+        """Initialize the sensor."""
+        self._metrics = metrics
+        self._name = f"{name} {self.label}"
+        self._unique_id = f"{unique_id}-{self.key}"
+
+    @property
+    def unique_id(self):
+        """Return an unique ID."""
+        return self._unique_id
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return self._name
+
+    @property
+    def entity_category(self):
+        """Metrics are diagnostic."""
+        return EntityCategory.DIAGNOSTIC
+
+    @property
+    def entity_registry_enabled_default(self):
+        """Only create the sensors when asked for."""
+        return False
+
+
+class FhwiseErrorsSensor(FhwiseMetricSensor):
+    """Number of failed device commands."""
+
+    key = "command_errors"
+    label = "command errors"
+
+    @property
+    def native_value(self):
+        """Return the number of failed commands."""
+        return self._metrics.errors
+
+
+class FhwiseTimeoutsSensor(FhwiseMetricSensor):
+    """Number of timed out device commands."""
+
+    key = "command_timeouts"
+    label = "command timeouts"
+
+    @property
+    def native_value(self):
+        """Return the number of timed out commands."""
+        return self._metrics.timeouts
+
+
+class FhwiseDominantCommandSensor(FhwiseMetricSensor):
+    """Command that spent the most time on the device."""
+
+    key = "dominant_command"
+    label = "dominant command"
+
+    @property
+    def native_value(self):
+        """Return the command name."""
+        return self._metrics.dominant_command
+
+    @property
+    def extra_state_attributes(self):
+        """Return the stats of the command."""
+        command = self._metrics.dominant_command
+        if command is None:
+            return None
+        return self._metrics.commands[command].as_dict()
+
+
+class FhwisePhaseSensor(FhwiseMetricSensor):
+    """Last duration of a refresh phase."""
+
+    def __init__(self, metrics, name, unique_id, phase):
+        """Initialize the sensor."""
+        self.key = f"{phase}_duration"
+        self.label = f"{phase.replace('_', ' ')} duration"
+        self._phase = phase
+        super().__init__(metrics, name, unique_id)
+
+    @property
+    def native_unit_of_measurement(self):
+        """Return ms."""
+        return UNIT_MS
+
+    @property
+    def native_value(self):
+        """Return the last duration in ms."""
+        histogram = self._metrics.phases.get(self._phase)
+        if histogram is None or histogram.last is None:
+            return None
+        return round(histogram.last, 1)
+
+    @property
+    def extra_state_attributes(self):
+        """Return the duration histogram."""
+        histogram = self._metrics.phases.get(self._phase)
+        if histogram is None:
+            return None
+        return histogram.as_dict()
@@ -0,0 +1,114 @@
+"""Transport interface shared by the fhwise player backends."""
+
+
+class FhwiseTransport:
+    """Async view of the fhwise player commands used by the component.
+
+    Method names mirror FhwisePlayer so the device code does not care which
+    backend answers. Backends only implement async_call.
+    """
+
+    host = None
+    port = None
+
+    async def async_start(self):
+        """Prepare the backend for requests."""
+
+    async def async_stop(self):
+        """Release the backend resources."""
+
+    async def async_call(self, command, *args):
+        """Send a command and return the decoded reply."""
+        raise NotImplementedError
+
+    async def send_heartbeat(self):
+        """Return device model."""
+        return await self.async_call("send_heartbeat")
+
+    async def send_play_pause(self):
+        """Toggle play/pause."""
+        return await self.async_call("send_play_pause")
+
+    async def get_play_mode(self):
+        """Return play mode index."""
+        return await self.async_call("get_play_mode")
+
+    async def set_toggle_play_mode(self):
+        """Step to the next play mode and return it."""
+        return await self.async_call("set_toggle_play_mode")
+
+    async def get_play_status(self):
+        """Return play status."""
+        return await self.async_call("get_play_status")
+
+    async def get_current_file_position(self):
+        """Return current position in ms."""
+        return await self.async_call("get_current_file_position")
+
+    async def get_current_file_name(self):
+        """Return current file name."""
+        return await self.async_call("get_current_file_name")
+
+    async def get_current_room_info(self):
+        """Return 'name::id' of the current room."""
+        return await self.async_call("get_current_room_info")
+
+    async def set_current_file_position(self, pos):
+        """Seek to pos in ms."""
+        return await self.async_call("set_current_file_position", pos)
+
+    async def get_current_list_file_account(self):
+        """Return number of files in the current list."""
+        return await self.async_call("get_current_list_file_account")
+
+    async def get_current_list_file_info(self, num):
+        """Return 'index::name::length::artist::path' of a list entry."""
+        return await self.async_call("get_current_list_file_info", num)
+
+    async def set_current_list_play_file(self, num):
+        """Play a list entry."""
+        return await self.async_call("set_current_list_play_file", num)
+
+    async def set_volume_level(self, num):
+        """Set main volume, range 0..15."""
+        return await self.async_call("set_volume_level", num)
+
+    async def get_volume_level(self):
+        """Return main volume, range 0..15."""
+        return await self.async_call("get_volume_level")
+
+    async def get_volume_source(self):
+        """Return input source index."""
+        return await self.async_call("get_volume_source")
+
+    async def set_volume_source(self, source):
+        """Select input source index."""
+        return await self.async_call("set_volume_source", source)
+
+    async def get_sub_area_control(self, number):
+        """Return 'area::volume::on' of a sub area."""
+        return await self.async_call("get_sub_area_control", number)
+
+    async def set_sub_area_control(self, number, volume, on):
+        """Set sub area volume and power."""
+        return await self.async_call("set_sub_area_control", number, volume, on)
+
+    async def get_eq_type(self):
+        """Return EQ type index."""
+        return await self.async_call("get_eq_type")
+
+    async def set_eq_type(self, type):
+        """Select EQ type index."""
+        return await self.async_call("set_eq_type", type)
+
+    async def get_eq_switch(self):
+        """Return EQ switch state."""
+        return await self.async_call("get_eq_switch")
+
+    async def set_eq_switch(self, on):
+        """Turn EQ on or off."""
+        return await self.async_call("set_eq_switch", on)
+
+    async def set_volume_toggle_mute(self):
+        """Toggle mute."""
+        return await self.async_call("set_volume_toggle_mute")
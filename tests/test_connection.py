@@ -0,0 +1,52 @@
+"""Keepalive pacing of the fhwise connection."""
+import asyncio
+
+from custom_components.fhwise.connection import FhwiseConnection
+
+KEEPALIVE_INTERVAL = 0.05
+RUN_TIME = 0.3
+# Wakeups tolerated per keepalive interval, for timer slack
+MAX_WAKEUPS = RUN_TIME / KEEPALIVE_INTERVAL + 2
+
+
+class CountingConnection(FhwiseConnection):
+    """Connection counting keepalive checks and failing every heartbeat."""
+
+    def __init__(self, link_up):
+        """Initialize the connection."""
+        super().__init__("127.0.0.1", 8080, keepalive_interval=KEEPALIVE_INTERVAL)
+        self.link_up = link_up
+        self.checks = 0
+        self.heartbeats = 0
+
+    @property
+    def connected(self):
+        """Count each check and report the configured link state."""
+        self.checks += 1
+        return self.link_up
+
+    async def async_call(self, command, *args):
+        """Fail the heartbeat without touching the link."""
+        self.heartbeats += 1
+        raise TimeoutError(command)
+
+
+async def _async_run_keepalive(link_up):
+    connection = CountingConnection(link_up)
+    task = asyncio.create_task(connection._async_keepalive())
+    await asyncio.sleep(RUN_TIME)
+    task.cancel()
+    return connection
+
+
+def test_keepalive_waits_while_disconnected():
+    """A down link is checked once per interval, not in a busy loop."""
+    connection = asyncio.run(_async_run_keepalive(False))
+    assert 0 < connection.checks <= MAX_WAKEUPS
+    assert connection.heartbeats == 0
+
+
+def test_keepalive_waits_after_failed_heartbeat():
+    """A failed heartbeat is retried after an interval, not back to back."""
+    connection = asyncio.run(_async_run_keepalive(True))
+    assert 0 < connection.heartbeats <= MAX_WAKEUPS
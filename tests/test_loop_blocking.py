@@ -0,0 +1,96 @@
+"""Event loop blocking of device calls against a slow blocking player."""
+import asyncio
+import time
+
+from custom_components.fhwise.executor import FhwiseExecutorTransport
+from custom_components.fhwise.media_player import (
+    MODEL_WLBM209,
+    FhwiseMusicPlayerDevice,
+)
+
+# Seconds each blocking call of the fake player takes
+CALL_DELAY = 0.05
+# Longest stall of the loop tolerated while the device is refreshed
+MAX_LOOP_LAG = 0.03
+MONITOR_INTERVAL = 0.005
+
+
+class SlowPlayer:
+    """Blocking FhwisePlayer stand-in answering after CALL_DELAY."""
+
+    def __init__(self, addr="127.0.0.1", port=8080):
+        """Initialize the player."""
+        self.addr = addr
+        self.port = port
+        self.calls = []
+
+    def _answer(self, name, result):
+        """Block like a socket round trip, then return result."""
+        self.calls.append(name)
+        time.sleep(CALL_DELAY)
+        return result
+
+    def send_heartbeat(self):
+        """Return the model."""
+        return self._answer("send_heartbeat", MODEL_WLBM209)
+
+    def get_current_room_info(self):
+        """Return the current room."""
+        return self._answer("get_current_room_info", "Living::1")
+
+    def get_sub_area_control(self, number):
+        """Return volume and power of a sub area."""
+        return self._answer("get_sub_area_control", f"{number}::8::1")
+
+    def get_volume_level(self):
+        """Return the volume level."""
+        return self._answer("get_volume_level", 8)
+
+    def get_play_status(self):
+        """Return the play status, playing."""
+        return self._answer("get_play_status", 1)
+
+    def get_current_file_name(self):
+        """Return the current track name."""
+        return self._answer("get_current_file_name", "Track 00001")
+
+    def get_current_file_position(self):
+        """Return the track position in ms."""
+        return self._answer("get_current_file_position", 1000)
+
+
+async def _async_max_lag(stop):
+    """Return the longest overshoot of a short sleep until stop is set."""
+    lag = 0
+    while not stop.is_set():
+        start = time.monotonic()
+        await asyncio.sleep(MONITOR_INTERVAL)
+        lag = max(lag, time.monotonic() - start - MONITOR_INTERVAL)
+    return lag
+
+
+async def _async_refresh_under_monitor():
+    player = SlowPlayer()
+    transport = FhwiseExecutorTransport(player)
+    device = FhwiseMusicPlayerDevice(transport, player.addr, player.port, MODEL_WLBM209)
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(_async_max_lag(stop))
+    start = time.monotonic()
+    try:
+        assert await transport.send_heartbeat() == MODEL_WLBM209
+        await device.async_update_fast()
+    finally:
+        elapsed = time.monotonic() - start
+        stop.set()
+        await transport.async_stop()
+    return player, device, elapsed, await monitor
+
+
+def test_refresh_does_not_block_loop():
+    """A refresh of blocking calls leaves the loop responsive."""
+    player, device, elapsed, lag = asyncio.run(_async_refresh_under_monitor())
+    assert device.reachable
+    assert device.area_state["4"].volume == 8
+    # One worker per device: the calls ran one after another
+    assert elapsed >= len(player.calls) * CALL_DELAY
+    assert lag < MAX_LOOP_LAG
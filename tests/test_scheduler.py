@@ -0,0 +1,40 @@
+"""Priority ordering of the fhwise command scheduler."""
+import asyncio
+import time
+
+from custom_components.fhwise.scheduler import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_COMMAND,
+    FhwiseCommandScheduler,
+)
+
+RATE = 20
+BACKGROUND_REQUESTERS = 16
+COMMANDS = 5
+
+
+async def _async_command_waits():
+    scheduler = FhwiseCommandScheduler(rate=RATE, burst=1)
+    stop = asyncio.Event()
+
+    async def background():
+        while not stop.is_set():
+            async with scheduler.slot(PRIORITY_BACKGROUND):
+                await asyncio.sleep(0)
+
+    tasks = [asyncio.create_task(background()) for _ in range(BACKGROUND_REQUESTERS)]
+    await asyncio.sleep(2 / RATE)
+    waits = []
+    for _ in range(COMMANDS):
+        start = time.monotonic()
+        async with scheduler.slot(PRIORITY_COMMAND):
+            waits.append(time.monotonic() - start)
+    stop.set()
+    await asyncio.gather(*tasks)
+    return waits
+
+
+def test_command_takes_next_token():
+    """A command waits for one token at most, not behind background reads."""
+    waits = asyncio.run(_async_command_waits())
+    assert max(waits) < 2 / RATE